@@ -1,30 +1,104 @@
+import hashlib
+import os
 import re
 from unicodedata import normalize
 
 import ebooklib
-from bs4 import BeautifulSoup
 from ebooklib import epub
-from sqlalchemy import exc, exists, insert, select
+from lxml import etree
+from sqlalchemy import bindparam, exc, func, select, update
+from sqlalchemy.dialects.postgresql import insert
 
+from app.core.constants import SEARCH_LANGUAGE
+from app.core.metrics import track_queries
 from app.db.database import SessionLocal
 from app.db.models import Author, Book, Chapter
 
+ASCII_SPACES = ' \t\n\r\f'
+XML_PARSER = etree.XMLParser(recover=True, resolve_entities=False)
+
+
+def get_label(nav_point: etree._Element) -> str:
+    """
+    Getting label of navPoint with normalized whitespaces.
+    """
+
+    return ' '.join(''.join(nav_point.find('{*}navLabel').itertext()).split())
+
+
+def get_text(element: etree._Element) -> str:
+    """
+    Getting text of element, strings are separated by new line.
+    Strings of whitespaces are collapsed to one new line or space.
+    """
+    strings = (string if string.strip(ASCII_SPACES)
+               else '\n' if '\n' in string
+               else ' '
+               for string in element.itertext())
+
+    return re.sub(r'\n+', '\n', '\n'.join(strings).strip())
+
+
+def get_ids(content: bytes) -> dict:
+    """
+    Parsing chapter file once and indexing its elements by id.
+
+    Args:
+        content (bytes): content of chapter file.
+
+    Returns:
+        dict: elements of file by id, whole document by None.
+    """
+    root = etree.fromstring(content, XML_PARSER)
+    ids = {element.get('id'): element
+           for element in root.iter()
+           if element.get('id') is not None}
+    ids[None] = root
+
+    return ids
+
+
+def get_etag(*parts: str) -> str:
+    """
+    Stable hash of parts of content, used as ETag.
+    For one part it's equal to md5() of text in Postgres.
+    """
+
+    return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+def get_book_etag(book_obj: dict,
+                  author_obj: dict,
+                  chapters_obj: tuple) -> str:
+    """
+    ETag of book made from its name, author and chapters.
+    """
+
+    return get_etag(book_obj['name'],
+                    author_obj['name'],
+                    *(f'{chapter["number"]}:{chapter["name"]}:'
+                      f'{chapter["etag"]}'
+                      for chapter in chapters_obj))
+
 
 def get_book_content(book_name: str) -> tuple[dict, dict, tuple]:
     """
     Getting book name, author, chapters list from book by file name.
+    Navigation is handled in one pass, every chapter file is parsed once
+    even if it contains several chapters. ETags of book and chapters
+    are computed here too.
 
     Args:
-        book_name (str): book_name in dir with files.
+        book_name (str): book_name in dir with files (or absolute path).
 
     Returns:
-        book_obj (dict): contains book name.
+        book_obj (dict): contains book name, etag.
         author_obj (dict): contains name of author.
         chapters_obj (tuple): contains number of chapter,
-                              name, text of chapter.
+                              name, text of chapter, etag.
     """
     try:
-        book = epub.read_epub(f'book/{book_name}',
+        book = epub.read_epub(os.path.join('book', book_name),
                               options={'ignore_ncx': True})
     except FileNotFoundError as e:
 
@@ -33,33 +107,50 @@ def get_book_content(book_name: str) -> tuple[dict, dict, tuple]:
     book_obj = {'name': book.get_metadata('DC', 'title')[0][0]}
     author_obj = {'name': book.get_metadata('DC', 'creator')[0][0]}
     navs = list(book.get_items_of_type(ebooklib.ITEM_NAVIGATION))
-    decoded_nav = navs[0].get_content().decode('utf-8')
-    decoded_nav = ' '.join(decoded_nav.split())
-    soup = BeautifulSoup(decoded_nav, 'xml')
-    navlabels = soup.find_all('navLabel')
-    labels = [navlabel.text.strip() for navlabel in navlabels]
-    paths = [soup.find(string=label)
-             .find_parent('navPoint')
-             .find('content')['src']
-             for label in labels]
-    chapters_text = []
-    for path in paths:
-        src_id = path.split('#')
-        chapter = book.get_item_with_href(src_id[0])
-        decoded_chap = chapter.get_content().decode('utf-8')
-        s = BeautifulSoup(decoded_chap, 'xml')
-        chapters_text.append(re.sub(r'\n+', '\n',
-                             (s.find(id=src_id[1])
-                              .get_text(separator='\n')
-                              .strip())))
-    chapters_obj = tuple([{'number': num,
-                           'name': label,
-                           'text': normalize('NFKD', chapters_text[num])}
-                         for num, label in enumerate(labels)])
-
-    return book_obj, author_obj, chapters_obj
+    nav = etree.fromstring(navs[0].get_content(), XML_PARSER)
+    files = {}
+    chapters_obj = []
+    for num, nav_point in enumerate(nav.iter('{*}navPoint')):
+        path, _, anchor = (nav_point.find('{*}content')
+                           .get('src')
+                           .partition('#'))
+        if path not in files:
+            files[path] = get_ids(book.get_item_with_href(path).get_content())
+        text = normalize('NFKD', get_text(files[path][anchor or None]))
+        chapters_obj.append({'number': num,
+                             'name': get_label(nav_point),
+                             'text': text,
+                             'etag': get_etag(text)})
+    book_obj['etag'] = get_book_etag(book_obj, author_obj, chapters_obj)
+
+    return book_obj, author_obj, tuple(chapters_obj)
+
+
+def insert_chapters():
+    """
+    Insert statement of chapters, search vector of every chapter
+    is computed in the same insert.
+    """
+
+    return (insert(Chapter)
+            .values(text=bindparam('text'),
+                    search_vector=func.to_tsvector(SEARCH_LANGUAGE,
+                                                   bindparam('text'))))
+
 
+def increment_books_count():
+    """
+    Update statement adding count of new books (added)
+    to stored books_count of author (author_id).
+    """
+    authors = Author.__table__
+
+    return (update(authors)
+            .where(authors.c.id == bindparam('author_id'))
+            .values(books_count=authors.c.books_count + bindparam('added')))
 
+
+@track_queries
 def add_to_db(book_obj: dict, author_obj: dict, chapters_obj: tuple):
     """
     Adding files to DB.
@@ -71,27 +162,28 @@ def add_to_db(book_obj: dict, author_obj: dict, chapters_obj: tuple):
                               name, text of chapter.
 
     Returns:
-        str: 'Success'
+        tuple: id of author and id of added book.
     """
-    session = SessionLocal()
-    if session.query(exists()
-                     .where(Author.name == author_obj['name'])).scalar():
+    with SessionLocal() as session:
+        session.execute(insert(Author)
+                        .values(author_obj)
+                        .on_conflict_do_nothing(index_elements=['name']))
         author_id = session.scalar(select(Author.id)
                                    .where(Author.name == author_obj['name']))
-    else:
-        author_id = session.scalar(insert(Author)
-                                   .returning(Author.id), author_obj)
 
-    book_obj['author_id'] = author_id
-    try:
-        book_id = session.scalar(insert(Book).returning(Book.id), book_obj)
-        session.scalar(insert(Chapter).values(book_id=book_id), chapters_obj)
+        book_obj['author_id'] = author_id
+        try:
+            book_id = session.scalar(insert(Book).returning(Book.id),
+                                     book_obj)
+            session.execute(insert_chapters().values(book_id=book_id),
+                            chapters_obj)
+            session.execute(increment_books_count(),
+                            {'author_id': author_id, 'added': 1})
 
-        session.commit()
-        session.close()
-    except exc.IntegrityError as e:
-        session.rollback()
+            session.commit()
+        except exc.IntegrityError as e:
+            session.rollback()
 
-        raise e
+            raise e
 
-    return 'Success'
+    return author_id, book_id
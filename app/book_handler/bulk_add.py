@@ -0,0 +1,199 @@
+"""
+Adding all .epub books from dir (or glob) to DB.
+
+Books are parsed in pool of processes and written to DB
+in batches with multi-row inserts.
+Usage: python -m app.book_handler.bulk_add {dir or glob} [--workers N]
+"""
+import argparse
+import glob
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import redis
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.book_handler.add_book import (get_book_content, increment_books_count,
+                                       insert_chapters)
+from app.core.cache import INVALIDATION_CHANNEL, book_scopes, generation_key
+from app.core.metrics import track_queries
+from app.db.database import SessionLocal
+from app.db.models import Author, Book
+
+BATCH_SIZE = 50
+
+
+def parse_book(path: str) -> tuple[str, tuple | None]:
+    """
+    Parsing book in worker process.
+
+    Args:
+        path (str): absolute path of book.
+
+    Returns:
+        tuple: path and content of book (None if book can't be handled).
+    """
+    try:
+        content = get_book_content(path)
+    except Exception:
+
+        return path, None
+
+    return path, content if isinstance(content, tuple) else None
+
+
+@track_queries
+def write_batch(books: list[tuple]) -> tuple[list[tuple], int]:
+    """
+    Writing batch of books to DB in one transaction.
+    Books already existing in DB (or repeated in batch) are skipped.
+
+    Args:
+        books (list): contents of books made by get_book_content.
+
+    Returns:
+        tuple: ids of added books with ids of authors
+               and count of added chapters.
+    """
+    with SessionLocal() as session, session.begin():
+        names = {author_obj['name'] for _, author_obj, _ in books}
+        session.execute(insert(Author)
+                        .values([{'name': name} for name in names])
+                        .on_conflict_do_nothing(index_elements=['name']))
+        author_ids = dict(session.execute(select(Author.name, Author.id)
+                                          .where(Author.name.in_(names)))
+                          .all())
+
+        unique = {}
+        for book_obj, author_obj, chapters_obj in books:
+            unique.setdefault(book_obj['name'],
+                              (author_ids[author_obj['name']],
+                               chapters_obj,
+                               book_obj['etag']))
+        book_ids = dict(session.execute(
+            insert(Book)
+            .values([{'name': name, 'author_id': author_id, 'etag': etag}
+                     for name, (author_id, _, etag) in unique.items()])
+            .on_conflict_do_nothing(index_elements=['name'])
+            .returning(Book.name, Book.id)).all())
+
+        chapters = [{**chapter, 'book_id': book_id}
+                    for name, book_id in book_ids.items()
+                    for chapter in unique[name][1]]
+        if chapters:
+            session.execute(insert_chapters(), chapters)
+
+        added = Counter(unique[name][0] for name in book_ids)
+        if added:
+            session.execute(increment_books_count(),
+                            [{'author_id': author_id, 'added': count}
+                             for author_id, count in added.items()])
+
+    return ([(unique[name][0], book_id) for name, book_id in book_ids.items()],
+            len(chapters))
+
+
+def invalidate_cache(added: list[tuple]):
+    """
+    Making outdated cache affected by added books.
+
+    Args:
+        added (list): ids of authors with ids of added books.
+    """
+    scopes = {scope
+              for author_id, book_id in added
+              for scope in book_scopes(author_id, book_id)}
+    client = redis.Redis.from_url(os.getenv('REDIS_URL',
+                                            'redis://book_api-redis'))
+    try:
+        with client.pipeline(transaction=False) as pipe:
+            for scope in scopes:
+                pipe.incr(generation_key(scope))
+                pipe.publish(INVALIDATION_CHANNEL, scope)
+            pipe.execute()
+    except redis.ConnectionError as e:
+        print(f'Cache is not invalidated, Redis is unavailable: {e}')
+
+
+def bulk_add(pattern: str, workers: int, batch_size: int) -> dict:
+    """
+    Adding all books matching pattern to DB.
+
+    Args:
+        pattern (str): dir with books or glob.
+        workers (int): count of processes parsing books.
+        batch_size (int): count of books written in one transaction.
+
+    Returns:
+        dict: stats of import.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*.epub')
+    paths = [os.path.abspath(path) for path in sorted(glob.glob(pattern))]
+    stats = {'files': len(paths),
+             'bytes': sum(os.path.getsize(path) for path in paths),
+             'added': 0,
+             'skipped': 0,
+             'failed': 0,
+             'chapters': 0}
+    added = []
+    batch = []
+    start = time.perf_counter()
+
+    def flush():
+        books, chapters = write_batch(batch)
+        added.extend(books)
+        stats['added'] += len(books)
+        stats['skipped'] += len(batch) - len(books)
+        stats['chapters'] += chapters
+        batch.clear()
+
+    # executor.map submits all books at once and keeps all parsed ones
+    # in memory, so no more than workers * batch_size books are
+    # submitted at the same time. Results are taken in order of paths.
+    window = max(workers * batch_size, 1)
+    paths_left = iter(paths)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for path in islice(paths_left, window - len(pending)):
+                pending.append(executor.submit(parse_book, path))
+            if not pending:
+                break
+            path, content = pending.popleft().result()
+            if content is None:
+                print(f'Book can\'t be handled: {path}')
+                stats['failed'] += 1
+                continue
+            batch.append(content)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+    if added:
+        invalidate_cache(added)
+    stats['seconds'] = time.perf_counter() - start
+
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('pattern', help='dir with .epub books or glob')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    stats = bulk_add(args.pattern, args.workers, args.batch_size)
+    seconds = stats['seconds'] or 1e-9
+    print(f'files: {stats["files"]}, added: {stats["added"]}, '
+          f'skipped: {stats["skipped"]}, failed: {stats["failed"]}')
+    print(f'time: {seconds:.1f} s, '
+          f'{stats["added"] / seconds:.1f} books/s, '
+          f'{stats["chapters"] / seconds:.1f} chapters/s, '
+          f'{stats["bytes"] / seconds / 1024 / 1024:.1f} MB/s')
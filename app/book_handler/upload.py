@@ -0,0 +1,107 @@
+import os
+
+from aiofiles import tempfile
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.constants import BOOK_TOO_LARGE, LENGTH_REQUIRED
+
+BOOK_DIR = 'book'
+MAX_BOOK_SIZE = int(os.getenv('MAX_BOOK_SIZE', 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def check_book_size(size: int):
+    """
+    Checks size of uploaded book.
+
+    Args:
+        size (int): size of book (or of request body) in bytes.
+
+    Raises:
+        HTTPException: book is larger than MAX_BOOK_SIZE.
+    """
+    if size > MAX_BOOK_SIZE:
+
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=BOOK_TOO_LARGE.format(max_size=MAX_BOOK_SIZE)
+        )
+
+
+async def save_upload(book: UploadFile) -> str:
+    """
+    Saving uploaded book to file with unique name in BOOK_DIR.
+    Book is copied by chunks, so it's never fully loaded in memory.
+
+    Args:
+        book (UploadFile): uploaded book.
+
+    Returns:
+        str: file name of saved book in BOOK_DIR.
+
+    Raises:
+        HTTPException: book is larger than MAX_BOOK_SIZE.
+    """
+    size = 0
+    async with tempfile.NamedTemporaryFile('wb',
+                                           dir=BOOK_DIR,
+                                           suffix='.epub',
+                                           delete=False) as out_file:
+        try:
+            while chunk := await book.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                check_book_size(size)
+
+                await out_file.write(chunk)
+
+        except HTTPException:
+            os.remove(out_file.name)
+
+            raise
+
+    return os.path.basename(out_file.name)
+
+
+class BookSizeLimitMiddleware:
+    """
+    Rejecting too large books by Content-Length
+    before body of request is read.
+    Requests without Content-Length (chunked) are rejected too,
+    otherwise their body would be read whatever its size.
+    Other requests than POST to path pass without any checks.
+    """
+    def __init__(self, app: ASGIApp, path: str) -> None:
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if (scope['type'] != 'http'
+                or scope['method'] != 'POST'
+                or scope['path'] != self.path):
+            await self.app(scope, receive, send)
+
+            return
+
+        content_length = Headers(scope=scope).get('content-length', '')
+        response = None
+        if not content_length.isdigit():
+            response = JSONResponse(
+                {'detail': LENGTH_REQUIRED},
+                status_code=status.HTTP_411_LENGTH_REQUIRED
+            )
+        else:
+            try:
+                check_book_size(int(content_length))
+            except HTTPException as e:
+                response = JSONResponse({'detail': e.detail},
+                                        status_code=e.status_code)
+        if response is None:
+            await self.app(scope, receive, send)
+
+            return
+
+        await response(scope, receive, send)
@@ -1,4 +1,23 @@
+from typing import Generic, TypeVar
+
 from fastapi_pagination import Page
+from fastapi_pagination.cursor import CursorPage
 from pydantic import Field
 
+T = TypeVar('T')
+
+
+class ApproximateCursorPage(CursorPage[T], Generic[T]):
+    """
+    Page of cursor pagination with approximate count of all items.
+    """
+    total: int | None = Field(None,
+                              description=('Approximate count of items '
+                                           '(null if table is not analyzed '
+                                           'yet).'))
+
+
 CustomPage = Page.with_custom_options(size=Field(default=5, ge=1, le=10))
+CustomCursorPage = ApproximateCursorPage.with_custom_options(
+    size=Field(default=5, ge=1, le=10)
+)
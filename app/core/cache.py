@@ -1,12 +1,321 @@
+import asyncio
 import hashlib
+import inspect
+import logging
+import os
+import struct
+import time
+from collections import OrderedDict
+from functools import wraps
 
 import orjson
 from fastapi import Request, Response
 from fastapi.encoders import jsonable_encoder
 from fastapi_cache import Coder, FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from pydantic import parse_obj_as
 
+from app.core.compression import (MIN_COMPRESS_SIZE,
+                                  PRECOMPRESS_BROTLI_QUALITY,
+                                  PrecompressedResponse, compress, decompress)
+from app.core.metrics import LOCAL_CACHE_REQUESTS, count_cache_request, timed
 
-def custom_key_builder(
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'fastapi-cache'
+# Version of format of cache entries, changing it makes old keys unused.
+CACHE_FORMAT_VERSION = 2
+# Level of gzip compression of responses in cache (0 turns it off).
+CACHE_COMPRESSION_LEVEL = int(os.getenv('CACHE_COMPRESSION_LEVEL', 6))
+# Max size of in-process cache in front of Redis in bytes (0 turns it off).
+LOCAL_CACHE_SIZE = int(os.getenv('LOCAL_CACHE_SIZE', 64 * 1024 * 1024))
+# Max lifetime of entries in in-process cache in seconds.
+LOCAL_CACHE_TTL = int(os.getenv('LOCAL_CACHE_TTL', 60))
+# Time in seconds while expired responses are served during refreshing.
+CACHE_STALE_EXPIRE = int(os.getenv('CACHE_STALE_EXPIRE', 60 * 60))
+# Time in seconds workers wait for other worker computing response
+# (0 turns off locks between workers).
+CACHE_LOCK_TIMEOUT = int(os.getenv('CACHE_LOCK_TIMEOUT', 10))
+CACHE_LOCK_POLL = 0.05
+# Head of cache entry: time until which it's fresh and md5 of response.
+ENTRY_HEAD = struct.Struct('>d32s')
+# Channel of Redis pub/sub where invalidated scopes are published.
+INVALIDATION_CHANNEL = f'{CACHE_PREFIX}:invalidation'
+AUTHORS_NAMESPACE = 'authors'
+AUTHOR_NAMESPACE = 'author'
+BOOKS_NAMESPACE = 'books'
+BOOK_NAMESPACE = 'book'
+NAMESPACE_KWARGS = {
+    AUTHOR_NAMESPACE: 'author_id',
+    BOOK_NAMESPACE: 'book_id',
+}
+
+
+def namespace_scope(namespace: str, item_id: int = None) -> str:
+    """
+    Scope of cache keys which are invalidated together
+    (e.g. 'books' or 'book:1').
+    """
+    if item_id is None:
+
+        return namespace
+
+    return f'{namespace}:{item_id}'
+
+
+def generation_key(scope: str) -> str:
+    """
+    Key of generation counter of scope in redis.
+    """
+
+    return f'{CACHE_PREFIX}:generation:{scope}'
+
+
+class LocalCache:
+    """
+    In-process LRU cache limited by total size of values in bytes.
+    Every entry also expires after ttl seconds.
+    """
+    def __init__(self, max_size: int, ttl: int) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.size = 0
+        # key -> (value, size, monotonic time of expiration)
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        """
+        Value by key (None if there is no such key or it's expired).
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+
+            return None
+
+        if entry[2] <= time.monotonic():
+            self.pop(key)
+
+            return None
+
+        self._entries.move_to_end(key)
+
+        return entry[0]
+
+    def set(self, key: str, value, size: int, expire: int = None):
+        """
+        Storing value evicting least recently used entries if needed.
+        Values larger than whole cache are not stored.
+
+        Args:
+            key (str): key.
+            value: value.
+            size (int): size of value in bytes.
+            expire (int): lifetime in seconds (not longer than ttl).
+        """
+        self.pop(key)
+        if size > self.max_size:
+
+            return
+
+        while self.size + size > self.max_size:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+        expire = min(expire or self.ttl, self.ttl)
+        self._entries[key] = (value, size, time.monotonic() + expire)
+        self.size += size
+
+    def pop(self, key: str):
+        """
+        Removing key if it exists.
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def pop_prefix(self, prefix: str):
+        """
+        Removing all keys starting with prefix.
+        """
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self.pop(key)
+
+    def clear(self):
+        """
+        Removing all keys.
+        """
+        self._entries.clear()
+        self.size = 0
+
+
+class TieredRedisBackend(RedisBackend):
+    """
+    Redis backend with in-process LocalCache in front of it.
+
+    Cached responses never change (key contains generation of scope),
+    so they're kept locally until they're evicted or expired.
+    Generations of scopes are kept locally only while backend
+    is subscribed to INVALIDATION_CHANNEL, every worker forgets
+    generation (and responses) of scope published there.
+    """
+    def __init__(self, redis, local: LocalCache) -> None:
+        super().__init__(redis)
+        self.local = local
+        self._subscribed = False
+        self._invalidations = 0
+        self._listener: asyncio.Task | None = None
+
+    async def get_with_ttl(self,
+                           key: str,
+                           skip_local: bool = False
+                           ) -> tuple[int, bytes | None]:
+        """
+        Value of key with its ttl, from LocalCache if it's there.
+        skip_local=True reads value from Redis (e.g. waiting for value
+        updated by other worker) and replaces local one with it.
+        """
+        entry = None if skip_local else self.local.get(key)
+        if not skip_local:
+            LOCAL_CACHE_REQUESTS.labels(
+                'miss' if entry is None else 'hit'
+            ).inc()
+        if entry is not None:
+            value, expires_at = entry
+
+            return max(int(expires_at - time.monotonic()), 0), value
+
+        ttl, value = await super().get_with_ttl(key)
+        if value is not None and ttl > 0:
+            self.local.set(key,
+                           (value, time.monotonic() + ttl),
+                           len(key) + len(value),
+                           ttl)
+
+        return ttl, value
+
+    async def set(self, key: str, value: bytes, expire: int = None):
+        await super().set(key, value, expire)
+        self.local.set(key,
+                       (value, time.monotonic() + (expire or 0)),
+                       len(key) + len(value),
+                       expire)
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        """
+        Values of keys, from LocalCache if they're there,
+        others are read from Redis with one MGET.
+        """
+        entries = [self.local.get(key) for key in keys]
+        values = [None if entry is None else entry[0] for entry in entries]
+        for value in values:
+            LOCAL_CACHE_REQUESTS.labels(
+                'miss' if value is None else 'hit'
+            ).inc()
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if missing:
+            found = dict(zip(missing, await self.redis.mget(missing)))
+            values = [found[key] if value is None else value
+                      for key, value in zip(keys, values)]
+
+        return values
+
+    async def set_many(self, items: dict[str, bytes], expire: int):
+        """
+        Setting several keys with one pipeline.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(key, value, ex=expire)
+            await pipe.execute()
+        for key, value in items.items():
+            self.local.set(key,
+                           (value, time.monotonic() + expire),
+                           len(key) + len(value),
+                           expire)
+
+    async def get_generation(self, scope: str) -> int:
+        """
+        Current generation of scope.
+
+        Args:
+            scope (str): scope of cache keys.
+
+        Returns:
+            int: generation (0 if scope was never invalidated).
+        """
+        key = generation_key(scope)
+        generation = self.local.get(key)
+        if generation is not None:
+
+            return generation
+
+        invalidations = self._invalidations
+        generation = int(await self.redis.get(key) or 0)
+        # Generation read before invalidation came can be outdated.
+        if self._subscribed and invalidations == self._invalidations:
+            self.local.set(key, generation, len(key))
+
+        return generation
+
+    def forget(self, scopes):
+        """
+        Removing generations and responses of scopes from LocalCache.
+
+        Args:
+            scopes: invalidated scopes.
+        """
+        self._invalidations += 1
+        for scope in scopes:
+            self.local.pop(generation_key(scope))
+            self.local.pop_prefix(f'{FastAPICache.get_prefix()}:{scope}:')
+
+    async def listen(self):
+        """
+        Forgetting scopes published in INVALIDATION_CHANNEL.
+        Everything is forgotten on (re)subscribing,
+        because invalidations could be missed without subscription.
+        """
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    self._invalidations += 1
+                    self.local.clear()
+                    self._subscribed = True
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.forget([message['data'].decode()])
+            except asyncio.CancelledError:
+
+                raise
+
+            except Exception:
+                logger.warning('Subscription to invalidations is lost',
+                               exc_info=True)
+            finally:
+                self._subscribed = False
+            await asyncio.sleep(1)
+
+    def start(self):
+        """
+        Starting listening of invalidations (only if LocalCache is on).
+        """
+        if self.local.max_size:
+            self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        """
+        Stopping listening of invalidations.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+async def custom_key_builder(
     func,
     namespace: str = "",
     request: Request = None,
@@ -17,33 +326,544 @@ def custom_key_builder(
     """
     Generating cache key with request.query_params
     to cache paginated results correctly.
+    Key contains scope of namespace and its current generation,
+    so increasing generation makes all keys of scope outdated.
     """
-    prefix = f'{FastAPICache.get_prefix()}:{namespace}:'
     if 'db' in kwargs:
         del kwargs['db']
 
-    return (prefix
-            + hashlib.md5(
-                          f'{func.__module__}:{func.__name__}'
-                          f':{args}:{kwargs}:{request.query_params}'
-                          .encode()).hexdigest())
+    return (await key_prefix(namespace, kwargs)
+            + key_digest(func, args, kwargs, request.query_params))
+
+
+async def key_prefix(namespace: str, kwargs: dict) -> str:
+    """
+    Prefix of cache keys: scope of namespace and its current generation.
+    """
+    scope = namespace_scope(namespace,
+                            kwargs.get(NAMESPACE_KWARGS.get(namespace)))
+    generation = await FastAPICache.get_backend().get_generation(scope)
+
+    return f'{FastAPICache.get_prefix()}:{scope}:{generation}:'
+
+
+def key_digest(func, args: tuple, kwargs: dict, query_params) -> str:
+    """
+    Hash of endpoint and its arguments in cache key.
+    """
+
+    return hashlib.md5(f'{CACHE_FORMAT_VERSION}:'
+                       f'{func.__module__}:{func.__name__}'
+                       f':{args}:{kwargs}:{query_params}'
+                       .encode()).hexdigest()
+
+
+async def endpoint_keys(func, namespace: str,
+                        kwargs_list: list[dict]) -> list[str]:
+    """
+    Cache keys of responses of endpoint to requests without query params,
+    e.g. to read several of them at once.
+
+    Args:
+        func: endpoint.
+        namespace (str): namespace of cache keys of endpoint.
+        kwargs_list (list): arguments of endpoint for every key
+                            (in order of its parameters, without db).
+
+    Returns:
+        list: cache keys.
+    """
+    prefixes = {}
+    keys = []
+    for kwargs in kwargs_list:
+        item_id = kwargs.get(NAMESPACE_KWARGS.get(namespace))
+        if item_id not in prefixes:
+            prefixes[item_id] = await key_prefix(namespace, kwargs)
+        keys.append(prefixes[item_id] + key_digest(func, (), kwargs, ''))
+
+    return keys
+
+
+def book_scopes(author_id: int, book_id: int) -> tuple[str, ...]:
+    """
+    Scopes of cache affected by adding book:
+    lists of authors and books, author of book and book itself.
+    """
+
+    return (namespace_scope(AUTHORS_NAMESPACE),
+            namespace_scope(BOOKS_NAMESPACE),
+            namespace_scope(AUTHOR_NAMESPACE, author_id),
+            namespace_scope(BOOK_NAMESPACE, book_id))
+
+
+async def invalidate_book(author_id: int, book_id: int):
+    """
+    Making outdated cache affected by adding book.
+    Costs one INCR per scope, old keys are removed by expire.
+    Scopes are also published for LocalCache of every worker.
+
+    Args:
+        author_id (int): id of author of book.
+        book_id (int): id of book.
+    """
+    scopes = book_scopes(author_id, book_id)
+    backend = FastAPICache.get_backend()
+    async with backend.redis.pipeline(transaction=False) as pipe:
+        for scope in scopes:
+            pipe.incr(generation_key(scope))
+            pipe.publish(INVALIDATION_CHANNEL, scope)
+        await pipe.execute()
+    backend.forget(scopes)
 
 
 class CustomORJsonCoder(Coder):
     """
-    Custom encoder receiving response_model
+    Custom coder receiving response_model
     to correctly cache result made with response_model ORM.
+    Final JSON body is cached, so hit is returned as ready Response
+    without validating and serializing it by response_model again.
     """
     def __init__(self, response_model) -> None:
         self.response_model = response_model
 
     def encode(self, value: any) -> bytes:
         return orjson.dumps(
-            self.response_model.from_orm(value),
+            parse_obj_as(self.response_model, value),
             default=jsonable_encoder,
             option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
         )
 
     @classmethod
-    def decode(cls, value: bytes) -> any:
-        return orjson.loads(value)
+    def decode(cls, value: bytes) -> Response:
+        return Response(value, media_type='application/json')
+
+
+class ResponseCoder(Coder):
+    """
+    Coder of ready responses (e.g. with ETag headers):
+    status, headers and body are cached as is.
+    Body is compressed once with gzip (CACHE_COMPRESSION_LEVEL)
+    and brotli, compressed variant accepted by client is sent as is.
+    CACHE_COMPRESSION_LEVEL=0 turns compression off.
+    """
+    @classmethod
+    def encode(cls, value: Response) -> bytes:
+        variants = {}
+        if CACHE_COMPRESSION_LEVEL and len(value.body) >= MIN_COMPRESS_SIZE:
+            variants = {
+                'gzip': compress(value.body, 'gzip', CACHE_COMPRESSION_LEVEL),
+                'br': compress(value.body, 'br', PRECOMPRESS_BROTLI_QUALITY),
+            }
+        head = orjson.dumps({'status_code': value.status_code,
+                             'headers': dict(value.headers),
+                             'encodings': [(encoding, len(body))
+                                           for encoding, body
+                                           in variants.items()]})
+
+        return b'\n'.join([head, *variants.values()] if variants
+                          else [head, value.body])
+
+    @classmethod
+    def decode(cls, value: bytes) -> Response:
+        head, _, body = value.partition(b'\n')
+        head = orjson.loads(head)
+        if not head['encodings']:
+
+            return Response(body,
+                            status_code=head['status_code'],
+                            headers=head['headers'])
+
+        variants = {}
+        start = 0
+        for encoding, size in head['encodings']:
+            variants[encoding] = body[start:start + size]
+            start += size + 1
+
+        return PrecompressedResponse(variants,
+                                     status_code=head['status_code'],
+                                     headers=head['headers'])
+
+    @classmethod
+    def decode_body(cls, value: bytes) -> bytes:
+        """
+        Decompressed body of cached response (e.g. to combine it
+        with other ones).
+        """
+        response = cls.decode(value)
+        if isinstance(response, PrecompressedResponse):
+            encoding, body = next(iter(response.variants.items()))
+
+            return decompress(body, encoding)
+
+        return response.body
+
+
+# Computations of responses in progress by cache key.
+_flights: dict[str, asyncio.Future] = {}
+
+
+def pack_entry(encoded: bytes, expire: int) -> bytes:
+    """
+    Cache entry: encoded response with time until which it's fresh
+    and its md5 (used as ETag).
+    """
+    if isinstance(encoded, str):
+        encoded = encoded.encode()
+
+    return ENTRY_HEAD.pack(time.time() + expire,
+                           hashlib.md5(encoded).hexdigest().encode()) + encoded
+
+
+def unpack_entry(entry: bytes) -> tuple[float, str, bytes]:
+    """
+    Time until which entry is fresh, md5 and encoded response.
+    """
+    fresh_until, etag = ENTRY_HEAD.unpack_from(entry)
+
+    return fresh_until, etag.decode(), entry[ENTRY_HEAD.size:]
+
+
+def is_fresh(entry: bytes) -> bool:
+    """
+    Checks if entry isn't expired yet.
+    """
+
+    return ENTRY_HEAD.unpack_from(entry)[0] > time.time()
+
+
+def lock_key(key: str) -> str:
+    """
+    Key of lock of worker computing response of key.
+    """
+
+    return f'{key}:lock'
+
+
+async def acquire_lock(key: str) -> bool:
+    """
+    Trying to become the only worker computing response of key.
+    Lock expires after CACHE_LOCK_TIMEOUT in case worker dies.
+
+    Returns:
+        bool: True if lock is acquired (or locks are off).
+    """
+    if not CACHE_LOCK_TIMEOUT:
+
+        return True
+
+    try:
+
+        return bool(await FastAPICache.get_backend().redis.set(
+            lock_key(key), 1, nx=True, ex=CACHE_LOCK_TIMEOUT
+        ))
+    except Exception:
+        logger.warning('Error acquiring lock of cache key %s', key,
+                       exc_info=True)
+
+        return True
+
+
+async def release_lock(key: str):
+    """
+    Releasing lock of key.
+    """
+    if not CACHE_LOCK_TIMEOUT:
+
+        return
+
+    try:
+        await FastAPICache.get_backend().redis.delete(lock_key(key))
+    except Exception:
+        logger.warning('Error releasing lock of cache key %s', key,
+                       exc_info=True)
+
+
+async def get_fresh(key: str) -> bytes | None:
+    """
+    Reading fresh entry of key from Redis (local cache is skipped).
+
+    Returns:
+        bytes: entry (None if it's missing or stale).
+    """
+    try:
+        _, entry = await FastAPICache.get_backend().get_with_ttl(
+            key, skip_local=True
+        )
+    except Exception:
+
+        return None
+
+    return entry if entry is not None and is_fresh(entry) else None
+
+
+async def wait_for_refresh(key: str) -> bytes | None:
+    """
+    Waiting for fresh entry computed by other worker.
+
+    Returns:
+        bytes: entry (None if it isn't computed in CACHE_LOCK_TIMEOUT).
+    """
+    deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_LOCK_POLL)
+        entry = await get_fresh(key)
+        if entry is not None:
+
+            return entry
+
+    return None
+
+
+async def refresh(key: str, call, coder, expire: int, locked: bool) -> bytes:
+    """
+    Computing response and storing it in cache.
+    If other worker holds lock of key, its result is waited for.
+
+    Args:
+        key (str): cache key.
+        call: coroutine function computing response.
+        coder: coder of response.
+        expire (int): time in seconds while response is fresh.
+        locked (bool): lock of key is already acquired.
+
+    Returns:
+        bytes: entry of cache.
+    """
+    if not locked:
+        locked = await acquire_lock(key)
+        if not locked:
+            entry = await wait_for_refresh(key)
+            if entry is not None:
+
+                return entry
+
+    try:
+        # Other worker could refresh entry and release lock between
+        # reading of stale (or missing) entry and acquiring of lock.
+        if locked and CACHE_LOCK_TIMEOUT:
+            entry = await get_fresh(key)
+            if entry is not None:
+
+                return entry
+
+        value = await call()
+        with timed('encode'):
+            entry = pack_entry(coder.encode(value), expire)
+        try:
+            with timed('set'):
+                await FastAPICache.get_backend().set(
+                    key,
+                    entry,
+                    expire + CACHE_STALE_EXPIRE
+                )
+        except Exception:
+            logger.warning('Error setting cache key %s', key, exc_info=True)
+
+        return entry
+    finally:
+        if locked:
+            await release_lock(key)
+
+
+def start_flight(key: str, coro) -> asyncio.Future:
+    """
+    Starting computation of response shared by all requests of key.
+    """
+    flight = asyncio.ensure_future(coro)
+    _flights[key] = flight
+    flight.add_done_callback(lambda _: _flights.pop(key, None))
+
+    return flight
+
+
+def respond(entry: bytes, coder, response: Response):
+    """
+    Decoded response of entry with Cache-Control and ETag.
+    Headers are added to decoded Response (if it doesn't have them)
+    or to response of endpoint.
+    Entries without own Cache-Control (lists, author, search) are
+    invalidated by adding books before they expire, so clients
+    revalidate them by ETag on every request (no-cache).
+    """
+    _, etag, encoded = unpack_entry(entry)
+    with timed('decode'):
+        decoded = coder.decode(encoded)
+    headers = (decoded if isinstance(decoded, Response) else response).headers
+    if 'cache-control' not in headers:
+        headers['Cache-Control'] = 'no-cache'
+    if 'etag' not in headers:
+        headers['ETag'] = f'W/"{etag}"'
+
+    return decoded
+
+
+async def get_cached_bodies(func, namespace: str,
+                            kwargs_list: list[dict]) -> list[bytes | None]:
+    """
+    Bodies of responses of endpoint cached with ResponseCoder
+    (to requests without query params), read at once.
+    Expired responses are returned too.
+
+    Args:
+        func: endpoint.
+        namespace (str): namespace of cache keys of endpoint.
+        kwargs_list (list): arguments of endpoint for every response.
+
+    Returns:
+        list: bodies of responses (None if response isn't cached).
+    """
+    if not FastAPICache.get_enable():
+
+        return [None] * len(kwargs_list)
+
+    try:
+        keys = await endpoint_keys(func, namespace, kwargs_list)
+        with timed('get'):
+            entries = await FastAPICache.get_backend().get_many(keys)
+    except Exception:
+        logger.warning('Error retrieving cache keys of %s', func.__name__,
+                       exc_info=True)
+
+        return [None] * len(kwargs_list)
+
+    bodies = []
+    for entry in entries:
+        if entry is None:
+            bodies.append(None)
+            continue
+        count_cache_request(namespace,
+                            'hit' if is_fresh(entry) else 'stale',
+                            entry)
+        with timed('decode'):
+            bodies.append(ResponseCoder.decode_body(unpack_entry(entry)[2]))
+
+    return bodies
+
+
+async def cache_responses(func, namespace: str, kwargs_list: list[dict],
+                          responses: list[Response], expire: int = None):
+    """
+    Caching responses of endpoint with ResponseCoder at once,
+    as if they were computed by requests of endpoint without query params.
+
+    Args:
+        func: endpoint.
+        namespace (str): namespace of cache keys of endpoint.
+        kwargs_list (list): arguments of endpoint for every response.
+        responses (list): responses of endpoint.
+        expire (int): time in seconds while responses are fresh
+                      (FastAPICache expire by default).
+    """
+    if not FastAPICache.get_enable() or not responses:
+
+        return
+
+    expire = expire or FastAPICache.get_expire()
+    try:
+        keys = await endpoint_keys(func, namespace, kwargs_list)
+        entries = {}
+        for key, response in zip(keys, responses):
+            with timed('encode'):
+                entries[key] = pack_entry(ResponseCoder.encode(response),
+                                          expire)
+            count_cache_request(namespace, 'miss', entries[key])
+        with timed('set'):
+            await FastAPICache.get_backend().set_many(
+                entries,
+                expire + CACHE_STALE_EXPIRE
+            )
+    except Exception:
+        logger.warning('Error setting cache keys of %s', func.__name__,
+                       exc_info=True)
+
+
+def cache(namespace: str = '', coder=None, expire: int = None):
+    """
+    Caching responses of endpoint like fastapi_cache "cache" decorator,
+    but concurrent misses of key wait for one computation
+    (in worker and, with lock in Redis, between workers)
+    and expired responses are served for CACHE_STALE_EXPIRE seconds
+    while one request refreshes them.
+
+    Args:
+        namespace (str): namespace of cache keys.
+        coder: coder of responses (FastAPICache coder by default).
+        expire (int): time in seconds while response is fresh
+                      (FastAPICache expire by default).
+    """
+    def wrapper(func):
+        signature = inspect.signature(func)
+        # Request is needed by key builder, response - for headers.
+        signature = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter('request',
+                              inspect.Parameter.KEYWORD_ONLY,
+                              annotation=Request),
+            inspect.Parameter('response',
+                              inspect.Parameter.KEYWORD_ONLY,
+                              annotation=Response),
+        ])
+        func.__signature__ = signature
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request = kwargs.pop('request')
+            response = kwargs.pop('response')
+
+            async def call():
+
+                return await func(*args, **kwargs)
+
+            if (request.headers.get('Cache-Control') in ('no-store',
+                                                         'no-cache')
+                    or not FastAPICache.get_enable()):
+
+                return await call()
+
+            entry_coder = coder or FastAPICache.get_coder()
+            entry_expire = expire or FastAPICache.get_expire()
+            backend = FastAPICache.get_backend()
+            key = await FastAPICache.get_key_builder()(
+                func,
+                namespace,
+                request=request,
+                response=response,
+                args=args,
+                kwargs=kwargs.copy(),
+            )
+            try:
+                with timed('get'):
+                    _, entry = await backend.get_with_ttl(key)
+            except Exception:
+                logger.warning('Error retrieving cache key %s', key,
+                               exc_info=True)
+                entry = None
+
+            fresh = None
+            if entry is not None:
+                fresh = is_fresh(entry)
+                count_cache_request(namespace,
+                                    'hit' if fresh else 'stale',
+                                    entry)
+                if (fresh
+                        or key in _flights
+                        or not await acquire_lock(key)):
+
+                    return respond(entry, entry_coder, response)
+
+                flight = start_flight(key, refresh(key, call, entry_coder,
+                                                   entry_expire, True))
+            else:
+                flight = _flights.get(key) or start_flight(
+                    key, refresh(key, call, entry_coder, entry_expire, False)
+                )
+
+            entry = await asyncio.shield(flight)
+            if fresh is None:
+                count_cache_request(namespace, 'miss', entry)
+
+            return respond(entry, entry_coder, response)
+
+        return inner
+
+    return wrapper
@@ -0,0 +1,253 @@
+import gzip
+import zlib
+
+import brotli
+from fastapi import Response, status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Encodings in order of preference for equal q-values.
+ENCODINGS = ('br', 'gzip')
+# Responses smaller than this (in bytes) aren't worth compressing.
+MIN_COMPRESS_SIZE = 500
+COMPRESSIBLE_TYPES = ('text/', 'application/json')
+# Fast levels for compressing responses on every request.
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+# Slower quality of brotli for responses compressed once.
+PRECOMPRESS_BROTLI_QUALITY = 9
+# wbits of zlib for gzip container (streaming compression).
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    """
+    Compressing body with encoding ('br' or 'gzip').
+    """
+    if encoding == 'br':
+
+        return brotli.compress(body, quality=level)
+
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    """
+    Decompressing body compressed with encoding ('br' or 'gzip').
+    """
+    if encoding == 'br':
+
+        return brotli.decompress(body)
+
+    return gzip.decompress(body)
+
+
+def choose_encoding(accept_encoding: str, available) -> str | None:
+    """
+    Choosing encoding by Accept-Encoding header of request.
+
+    Args:
+        accept_encoding (str): value of Accept-Encoding.
+        available: encodings which can be used.
+
+    Returns:
+        str: most preferred available encoding (None = no compression).
+    """
+    weights = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+
+    candidates = [(weights.get(encoding, weights.get('*', 0.0)), -rank,
+                   encoding)
+                  for rank, encoding in enumerate(ENCODINGS)
+                  if encoding in available]
+    weight, _, encoding = max(candidates, default=(0.0, 0, None))
+
+    return encoding if weight > 0 else None
+
+
+def encoded_etag(etag: str | None, encoding: str) -> str | None:
+    """
+    ETag of compressed representation: strong ETag gets suffix
+    of encoding, weak one stays the same.
+    """
+    if etag is None or etag.startswith('W/'):
+
+        return etag
+
+    etag = etag.strip('"')
+
+    return f'"{etag}-{encoding}"'
+
+
+def encoded_headers(headers, encoding: str) -> dict:
+    """
+    Headers of response compressed with encoding.
+    """
+    headers = {key.lower(): value for key, value in headers.items()
+               if key.lower() != 'content-length'}
+    headers['content-encoding'] = encoding
+    headers['vary'] = 'Accept-Encoding'
+    etag = encoded_etag(headers.pop('etag', None), encoding)
+    if etag is not None:
+        headers['etag'] = etag
+
+    return headers
+
+
+class PrecompressedResponse(Response):
+    """
+    Response with body compressed beforehand with every encoding.
+    Variant is chosen by Accept-Encoding when response is sent,
+    body is decompressed only for clients without compression.
+    """
+    def __init__(self,
+                 variants: dict[str, bytes],
+                 status_code: int = status.HTTP_200_OK,
+                 headers: dict = None) -> None:
+        self.variants = variants
+        super().__init__(None, status_code=status_code, headers=headers)
+
+    async def __call__(self, scope, receive, send) -> None:
+        encoding = choose_encoding(
+            Headers(scope=scope).get('accept-encoding', ''),
+            self.variants
+        )
+        headers = {key: value for key, value in self.headers.items()
+                   if key != 'content-length'}
+        if encoding is None:
+            encoding, body = next(iter(self.variants.items()))
+            self.body = decompress(body, encoding)
+            headers['vary'] = 'Accept-Encoding'
+        else:
+            self.body = self.variants[encoding]
+            headers = encoded_headers(headers, encoding)
+        self.init_headers(headers)
+
+        await super().__call__(scope, receive, send)
+
+
+class StreamCompressor:
+    """
+    Compressor of body sent by parts (streaming response).
+    """
+    def __init__(self, encoding: str, level: int) -> None:
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=level)
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                               GZIP_WBITS)
+
+    def compress(self, data: bytes, more: bool) -> bytes:
+        """
+        Compressed part of body, last part (more=False) ends stream.
+        """
+        if self.encoding == 'br':
+
+            return self.compressor.process(data) + (
+                self.compressor.flush() if more else self.compressor.finish()
+            )
+
+        return self.compressor.compress(data) + self.compressor.flush(
+            zlib.Z_SYNC_FLUSH if more else zlib.Z_FINISH
+        )
+
+
+class CompressionMiddleware:
+    """
+    Compressing responses with encoding accepted by client (br or gzip).
+    Responses which are already compressed are sent as is.
+    Pure ASGI middleware (as GZipMiddleware of Starlette): messages
+    of response are changed on the way, body isn't collected.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+
+            return
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get('accept-encoding', ''), ENCODINGS
+        )
+        await CompressionResponder(self.app, encoding)(scope, receive, send)
+
+
+class CompressionResponder:
+    """
+    Compressing one response: start of response is held
+    until first part of body shows if it should be compressed.
+    """
+    def __init__(self, app: ASGIApp, encoding: str | None) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.send = None
+        self.start = None
+        self.started = False
+        self.compressor = None
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message['type'] == 'http.response.start':
+            self.start = message
+
+            return
+
+        if message['type'] != 'http.response.body':
+            await self.send(message)
+
+            return
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if self.started:
+            if self.compressor is not None:
+                message['body'] = self.compressor.compress(body, more_body)
+            await self.send(message)
+
+            return
+
+        self.started = True
+        headers = MutableHeaders(raw=self.start['headers'])
+        if (self.start['status'] != status.HTTP_200_OK
+                or 'content-encoding' in headers
+                or not headers.get('content-type', '').startswith(
+                    COMPRESSIBLE_TYPES
+                )
+                or (len(body) < MIN_COMPRESS_SIZE and not more_body)):
+            await self.send(self.start)
+            await self.send(message)
+
+            return
+
+        headers['vary'] = 'Accept-Encoding'
+        if self.encoding is not None:
+            level = DYNAMIC_LEVELS[self.encoding]
+            if more_body:
+                self.compressor = StreamCompressor(self.encoding, level)
+                message['body'] = self.compressor.compress(body, True)
+                del headers['content-length']
+            else:
+                message['body'] = compress(body, self.encoding, level)
+                headers['content-length'] = str(len(message['body']))
+            headers['content-encoding'] = self.encoding
+            etag = encoded_etag(headers.get('etag'), self.encoding)
+            if etag is not None:
+                headers['etag'] = etag
+        await self.send(self.start)
+        await self.send(message)
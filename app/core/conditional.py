@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Headers of 200 kept in 304 (Vary tells caches which encoding ETag is of).
+VALIDATOR_HEADERS = ('etag', 'last-modified', 'cache-control', 'vary')
+
+
+def immutable_headers(etag: str, modified: datetime) -> dict:
+    """
+    Headers of response which never changes:
+    ETag, Last-Modified and long-lived Cache-Control.
+
+    Args:
+        etag (str): etag of content.
+        modified (datetime): time of adding content.
+
+    Returns:
+        dict: headers (without ETag if it isn't computed yet).
+    """
+    modified = modified.astimezone(timezone.utc)
+    headers = {'Last-Modified': format_datetime(modified, usegmt=True),
+               'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+    if etag is not None:
+        headers['ETag'] = f'"{etag}"'
+
+    return headers
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks if etag is in If-None-Match (weak comparison).
+    """
+    if if_none_match.strip() == '*':
+
+        return True
+
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+
+    return etag.removeprefix('W/') in tags
+
+
+def is_not_modified(request_headers: Headers,
+                    response_headers: Headers) -> bool:
+    """
+    Checks if client already has content of response.
+    If-None-Match has priority over If-Modified-Since.
+    """
+    etag = response_headers.get('etag')
+    if_none_match = request_headers.get('if-none-match')
+    if if_none_match is not None:
+
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    last_modified = response_headers.get('last-modified')
+    if_modified_since = request_headers.get('if-modified-since')
+    if last_modified is None or if_modified_since is None:
+
+        return False
+
+    try:
+
+        return (parsedate_to_datetime(last_modified)
+                <= parsedate_to_datetime(if_modified_since))
+    except (TypeError, ValueError):
+
+        return False
+
+
+class ConditionalGetMiddleware:
+    """
+    Answering 304 Not Modified without body
+    if response has ETag (or Last-Modified) matching request.
+    Pure ASGI middleware: start of response is replaced,
+    its body is dropped.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            await self.app(scope, receive, send)
+
+            return
+
+        request_headers = Headers(scope=scope)
+        not_modified = False
+
+        async def send_conditional(message: Message):
+            nonlocal not_modified
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                not_modified = (
+                    message['status'] == status.HTTP_200_OK
+                    and is_not_modified(request_headers, headers)
+                )
+                if not_modified:
+                    message = {
+                        'type': 'http.response.start',
+                        'status': status.HTTP_304_NOT_MODIFIED,
+                        'headers': [(key, value)
+                                    for key, value in message['headers']
+                                    if key.decode('latin-1').lower()
+                                    in VALIDATOR_HEADERS]
+                    }
+            elif message['type'] == 'http.response.body' and not_modified:
+                if message.get('more_body', False):
+
+                    return
+
+                message = {'type': 'http.response.body', 'body': b''}
+            await send(message)
+
+        await self.app(scope, receive, send_conditional)
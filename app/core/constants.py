@@ -1,10 +1,27 @@
 from app.schemas import Message
 
+SEARCH_LANGUAGE = 'russian'
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Every match is ranked before offset, so deep pages of search in catalog
+# aren't allowed, as well as long lists of authors and books in filter.
+SEARCH_MAX_OFFSET = 500
+SEARCH_MAX_IDS = 50
+CHAPTERS_DEFAULT_COUNT = 5
+CHAPTERS_MAX_COUNT = 20
+BAD_CURSOR = 'Cursor is invalid, use next_page of previous page.'
 BAD_FILE_FORMAT = 'We support only .epub files now.'
+BOOK_TOO_LARGE = 'Book is too large, max size is {max_size} bytes.'
+LENGTH_REQUIRED = 'Content-Length of uploaded book is required.'
 BOOK_ALREADY_EXISTS = 'This book already exists in DB.'
+BOOK_NOT_HANDLED = 'Book can\'t be handled, check that it\'s correct .epub.'
+JOB_CANCELLED = 'Adding book was stopped by restart, upload it again.'
 NOT_FOUND_BOOK_ID = 'Book with id `{book_id}` doesn\'t exist.'
 NOT_FOUND_CHAPTER_NUMBER = ('Requested chapter № {chapter_number} '
                             'doesn\'t exist in book № {book_id}.')
+TOO_MANY_CHAPTERS = 'No more than {max_count} chapters at once.'
+TOO_MANY_IDS = 'No more than {max_count} values of {name} at once.'
+NOT_FOUND_JOB_ID = 'Job with id `{job_id}` doesn\'t exist.'
 NOT_FOUND_AUTHOR_ID = 'Author with id `{author_id}` doesn\'t exist.'
 RESPONSES = {
     404: {'model': Message,
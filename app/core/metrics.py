@@ -0,0 +1,174 @@
+import inspect
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Buckets of latencies in seconds (from cache hits to slow searches).
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5,
+                   1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram('book_api_request_duration_seconds',
+                            'Latency of requests by route.',
+                            ['method', 'route', 'status_code'],
+                            buckets=LATENCY_BUCKETS)
+DB_QUERY_LATENCY = Histogram('book_api_db_query_duration_seconds',
+                             'Latency of DB queries by crud function.',
+                             ['function'],
+                             buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter('book_api_cache_requests_total',
+                         'Requests of cached endpoints by result '
+                         '(hit, stale or miss).',
+                         ['namespace', 'result'])
+CACHE_PAYLOAD_BYTES = Counter('book_api_cache_payload_bytes_total',
+                              'Bytes of cache entries served by result.',
+                              ['namespace', 'result'])
+LOCAL_CACHE_REQUESTS = Counter('book_api_local_cache_requests_total',
+                               'Reads of local cache by result '
+                               '(hit or miss).',
+                               ['result'])
+CACHE_OPERATION_LATENCY = Histogram(
+    'book_api_cache_operation_duration_seconds',
+    'Latency of reading (get) and writing (set) cache, '
+    'encoding and decoding responses.',
+    ['operation'],
+    buckets=LATENCY_BUCKETS
+)
+POOL_CONNECTIONS = Gauge('book_api_pool_connections',
+                         'Connections of pools by state '
+                         '(size, in_use, overflow).',
+                         ['pool', 'state'])
+POOL_WAITS = Gauge('book_api_pool_waits',
+                   'Count of checkouts of connections from pools.',
+                   ['pool'])
+POOL_WAIT_SECONDS = Gauge('book_api_pool_wait_seconds_total',
+                          'Total time of waiting for connections.',
+                          ['pool'])
+
+# Name of crud function running queries in current task.
+query_function: ContextVar[str] = ContextVar('query_function',
+                                             default='other')
+
+
+def track_queries(func):
+    """
+    Tagging timings of queries run inside of func with its name.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            token = query_function.set(func.__name__)
+            try:
+
+                return await func(*args, **kwargs)
+            finally:
+                query_function.reset(token)
+
+        return inner
+
+    @wraps(func)
+    def inner(*args, **kwargs):
+        token = query_function.set(func.__name__)
+        try:
+
+            return func(*args, **kwargs)
+        finally:
+            query_function.reset(token)
+
+    return inner
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    context.query_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    DB_QUERY_LATENCY.labels(query_function.get()).observe(
+        time.perf_counter() - context.query_start
+    )
+
+
+def instrument_engine(engine):
+    """
+    Recording timings of queries of SQLAlchemy engine
+    (sync_engine of AsyncEngine).
+    """
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+class timed:
+    """
+    Context manager recording time of cache operation.
+    """
+    def __init__(self, operation: str) -> None:
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        CACHE_OPERATION_LATENCY.labels(self.operation).observe(
+            time.perf_counter() - self.start
+        )
+
+
+def count_cache_request(namespace: str, result: str, entry: bytes):
+    """
+    Counting request of cached endpoint and bytes of its cache entry.
+    """
+    CACHE_REQUESTS.labels(namespace, result).inc()
+    CACHE_PAYLOAD_BYTES.labels(namespace, result).inc(len(entry))
+
+
+def update_pool_gauges(stats: dict[str, dict]):
+    """
+    Setting gauges of pools by their stats (app.core.pools).
+    """
+    for pool, pool_stats in stats.items():
+        for state in ('size', 'in_use', 'overflow'):
+            POOL_CONNECTIONS.labels(pool, state).set(pool_stats[state])
+        POOL_WAITS.labels(pool).set(pool_stats['waits'])
+        POOL_WAIT_SECONDS.labels(pool).set(pool_stats['wait_seconds_total'])
+
+
+class LatencyMiddleware:
+    """
+    Recording latency of request by template of its route
+    (e.g. /books/{book_id}), so every book isn't separate series.
+    Pure ASGI middleware: status is taken from start of response.
+    """
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive,
+                       send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+
+            return
+
+        start = time.perf_counter()
+        # Error raised before response is started is answered with 500.
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            REQUEST_LATENCY.labels(
+                scope['method'],
+                route.path if route is not None else 'unmatched',
+                status_code
+            ).observe(time.perf_counter() - start)
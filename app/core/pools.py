@@ -0,0 +1,123 @@
+import os
+import time
+
+import redis.asyncio as redis
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Max count of connections to Redis of one worker.
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+# Time in seconds to wait for free connection to Redis.
+REDIS_POOL_TIMEOUT = int(os.getenv('REDIS_POOL_TIMEOUT', 20))
+
+
+class WaitStats:
+    """
+    Count, total and max time of waiting for connection from pool.
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool recording time of checkout of connections.
+    Stats are kept in class, so they survive recreating of pool.
+    """
+    waits = WaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+
+            return super()._do_get()
+        finally:
+            self.waits.add(time.perf_counter() - start)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool recording time of checkout of connections.
+    """
+    waits = WaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+
+            return super()._do_get()
+        finally:
+            self.waits.add(time.perf_counter() - start)
+
+
+class TimedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """
+    Redis pool waiting for free connection (instead of failing)
+    and recording time of checkout of connections.
+    """
+    waits = WaitStats()
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+
+            return await super().get_connection(command_name,
+                                                *keys,
+                                                **options)
+        finally:
+            self.waits.add(time.perf_counter() - start)
+
+
+def create_redis_pool() -> TimedBlockingConnectionPool:
+    """
+    Pool of connections to Redis shared by whole app
+    (cache, invalidations and jobs).
+    """
+
+    return TimedBlockingConnectionPool.from_url(
+        os.getenv('REDIS_URL', 'redis://book_api-redis'),
+        encoding='utf-8',
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+    )
+
+
+def wait_stats(waits: WaitStats) -> dict:
+    """
+    Stats of waiting for connections.
+    """
+
+    return {'waits': waits.count,
+            'wait_seconds_total': waits.total,
+            'wait_seconds_max': waits.max}
+
+
+def db_pool_stats(engine) -> dict:
+    """
+    Stats of pool of SQLAlchemy engine: size, connections in use,
+    connections over size of pool and time of waiting for connections.
+    """
+    pool = engine.pool
+
+    return {'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            **wait_stats(pool.waits)}
+
+
+def redis_pool_stats(pool: TimedBlockingConnectionPool) -> dict:
+    """
+    Stats of pool of Redis connections (overflow is always 0,
+    pool waits for free connection instead).
+    """
+
+    return {'size': pool.max_connections,
+            'in_use': pool.max_connections - pool.pool.qsize(),
+            'overflow': 0,
+            **wait_stats(pool.waits)}
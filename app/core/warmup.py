@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from typing import Annotated
+
+from fastapi import FastAPI, Path, Request
+from fastapi_cache import FastAPICache
+
+logger = logging.getLogger(__name__)
+
+# Count of first pages of lists of authors and books warmed up.
+WARMUP_PAGES = int(os.getenv('WARMUP_PAGES', 3))
+# Count of most requested books warmed up on startup.
+WARMUP_BOOKS = int(os.getenv('WARMUP_BOOKS', 20))
+# Count of opening chapters of every warmed up book.
+WARMUP_CHAPTERS = int(os.getenv('WARMUP_CHAPTERS', 3))
+# Max count of requests warming up cache at the same time.
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', 4))
+# Interval in seconds of saving counts of requests of books to Redis.
+POPULAR_SAVE_INTERVAL = 60
+
+_app: FastAPI | None = None
+_semaphore: asyncio.Semaphore | None = None
+_tasks: set[asyncio.Task] = set()
+_saver: asyncio.Task | None = None
+_book_requests: Counter = Counter()
+
+
+def popular_books_key() -> str:
+    """
+    Key of sorted set of books by count of requests in Redis.
+    """
+
+    return f'{FastAPICache.get_prefix()}:popular:books'
+
+
+def count_book_request(request: Request,
+                       book_id: Annotated[int, Path(ge=0)]):
+    """
+    Dependency counting requests of book (cached or not),
+    requests of warm-up aren't counted.
+    Counts are kept in worker and saved to Redis periodically.
+    """
+    if not request.scope.get('warm_up'):
+        _book_requests[book_id] += 1
+
+
+async def save_popular_books():
+    """
+    Adding counts of requests of books to sorted set in Redis.
+    """
+    if not _book_requests:
+
+        return
+
+    counts = dict(_book_requests)
+    _book_requests.clear()
+    async with FastAPICache.get_backend().redis.pipeline(
+        transaction=False
+    ) as pipe:
+        for book_id, count in counts.items():
+            pipe.zincrby(popular_books_key(), count, book_id)
+        await pipe.execute()
+
+
+async def get_popular_books(count: int) -> list[int]:
+    """
+    Ids of most requested books (of all workers).
+    """
+    if count <= 0:
+
+        return []
+
+    book_ids = await FastAPICache.get_backend().redis.zrevrange(
+        popular_books_key(), 0, count - 1
+    )
+
+    return [int(book_id) for book_id in book_ids]
+
+
+def list_paths() -> list[str]:
+    """
+    Paths of first pages of lists of authors and books
+    (first page is requested without params as clients do).
+    """
+    paths = []
+    for path in ('/authors/', '/books/'):
+        paths.append(path)
+        paths.extend(f'{path}?page={page}'
+                     for page in range(2, WARMUP_PAGES + 1))
+        paths.append(f'{path}cursor/')
+
+    return paths if WARMUP_PAGES > 0 else []
+
+
+def book_paths(book_id: int) -> list[str]:
+    """
+    Paths of book and its opening chapters.
+    """
+
+    return [f'/books/{book_id}',
+            *(f'/books/{book_id}/chapter/{number}'
+              for number in range(WARMUP_CHAPTERS))]
+
+
+async def request(path: str) -> int:
+    """
+    Sending GET request to app without network, so response is cached
+    by the same endpoint and key as response for client.
+
+    Returns:
+        int: status code of response.
+    """
+    path, _, query = path.partition('?')
+    status_code = None
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        # Client of warm-up never disconnects.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status_code
+        if message['type'] == 'http.response.start':
+            status_code = message['status']
+
+    scope = {'type': 'http',
+             'asgi': {'version': '3.0'},
+             'http_version': '1.1',
+             'method': 'GET',
+             'scheme': 'http',
+             'path': path,
+             'raw_path': path.encode(),
+             'query_string': query.encode(),
+             'root_path': '',
+             'headers': [(b'host', b'warmup'),
+                         (b'accept-encoding', b'br, gzip')],
+             'client': None,
+             'server': None,
+             'warm_up': True}
+    async with _semaphore:
+        # Requests left after stopping of warm-up are skipped.
+        if _app is None:
+
+            return None
+
+        await _app(scope, receive, send)
+
+    return status_code
+
+
+async def warm_up(paths: list[str]):
+    """
+    Requesting every path (WARMUP_CONCURRENCY at the same time).
+    Errors are logged, warm-up never breaks app.
+    """
+    results = await asyncio.gather(*(request(path) for path in paths),
+                                   return_exceptions=True)
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            logger.warning('Warm-up of %s failed', path, exc_info=result)
+
+
+def schedule(coro):
+    """
+    Running coroutine in background, reference is kept until it's done.
+    """
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def warm_up_startup():
+    """
+    Warming up lists and most requested books with their chapters.
+    """
+    try:
+        book_ids = await get_popular_books(WARMUP_BOOKS)
+    except Exception:
+        logger.warning('Popular books are unavailable', exc_info=True)
+        book_ids = []
+    await warm_up([*list_paths(),
+                   *(path for book_id in book_ids
+                     for path in book_paths(book_id))])
+
+
+def warm_up_book(author_id: int, book_id: int):
+    """
+    Warming up in background cache invalidated by adding book:
+    lists, author, book and its opening chapters.
+    """
+    if _app is not None:
+        schedule(warm_up([*list_paths(),
+                          f'/authors/{author_id}',
+                          *book_paths(book_id)]))
+
+
+async def save_popular_books_periodically():
+    """
+    Saving counts of requests of books every POPULAR_SAVE_INTERVAL.
+    """
+    while True:
+        await asyncio.sleep(POPULAR_SAVE_INTERVAL)
+        try:
+            await save_popular_books()
+        except Exception:
+            logger.warning('Counts of requests of books are not saved',
+                           exc_info=True)
+
+
+def start_warm_up(app: FastAPI):
+    """
+    Starting warm-up of cache and saving of counts of requests of books.
+    """
+    global _app, _semaphore, _saver
+    _app = app
+    _semaphore = asyncio.Semaphore(max(WARMUP_CONCURRENCY, 1))
+    schedule(warm_up_startup())
+    _saver = asyncio.create_task(save_popular_books_periodically())
+
+
+async def stop_warm_up():
+    """
+    Stopping warm-up and saving counts of requests of books left.
+    Requests in progress are finished (cancelling them could leave
+    sessions to DB open), queued ones are skipped.
+    """
+    global _app
+    _app = None
+    _saver.cancel()
+    await asyncio.gather(_saver, *_tasks, return_exceptions=True)
+    try:
+        await save_popular_books()
+    except Exception:
+        logger.warning('Counts of requests of books are not saved',
+                       exc_info=True)
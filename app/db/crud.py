@@ -1,134 +1,363 @@
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import func, select
-from sqlalchemy.orm import Session
+from sqlalchemy import (BigInteger, Integer, any_, cast, column, func, literal,
+                        select, table)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from app.core.constants import SEARCH_LANGUAGE
+from app.core.metrics import track_queries
 
 from .models import Author, Book, Chapter
 
+# Loader strategies of endpoints: every relationship serialized by endpoint
+# is loaded eagerly in fixed count of queries, others are never loaded.
+AUTHOR_LIST_OPTIONS = (raiseload('*'),)
+AUTHOR_OPTIONS = (selectinload(Author.books).load_only(Book.id, Book.name),
+                  raiseload('*'))
+BOOK_LIST_OPTIONS = (joinedload(Book.author).load_only(Author.id,
+                                                       Author.name),
+                     raiseload('*'))
+BOOK_OPTIONS = (joinedload(Book.author).load_only(Author.id, Author.name),
+                selectinload(Book.chapters).load_only(Chapter.number,
+                                                      Chapter.name),
+                raiseload('*'))
+
+HEADLINE_OPTIONS = ('MaxFragments=2, '
+                    'MaxWords=20, '
+                    'StartSel="<<", '
+                    'StopSel=">>"')
+
 
-def get_author_list(db: Session):
+@track_queries
+async def get_author_list(db: AsyncSession):
     """
     Getting paginated list of all authors in DB ordered by id.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
+
+    Returns:
+        list: authors.
+    """
+
+    return await paginate(db, select(Author)
+                          .options(*AUTHOR_LIST_OPTIONS)
+                          .order_by(Author.id))
+
+
+@track_queries
+async def get_approximate_count(db: AsyncSession, model):
+    """
+    Getting approximate count of rows in table of model
+    from planner statistics (pg_class.reltuples) without scanning table.
+
+    Args:
+        db (AsyncSession): database session.
+        model: model of table.
+
+    Returns:
+        int: approximate count of rows (None if table is not analyzed yet).
+    """
+    reltuples = column('reltuples')
+    count = await db.scalar(
+        select(cast(reltuples, BigInteger))
+        .select_from(table('pg_class', column('oid'), reltuples))
+        .where(column('oid') == func.to_regclass(model.__tablename__))
+    )
+
+    return count if count is not None and count >= 0 else None
+
+
+@track_queries
+async def get_author_cursor_list(db: AsyncSession):
+    """
+    Getting page of authors by cursor (keyset pagination by id).
+    Every page costs the same regardless of depth,
+    count of authors is approximate.
+
+    Args:
+        db (AsyncSession): database session.
 
     Returns:
         list: authors.
     """
 
-    return paginate(db, select(Author).order_by(Author.id))
+    return await paginate(db,
+                          select(Author)
+                          .options(*AUTHOR_LIST_OPTIONS)
+                          .order_by(Author.id),
+                          additional_data={
+                              'total': await get_approximate_count(db, Author)
+                          })
 
 
-def get_author(db: Session, author_id: int):
+@track_queries
+async def get_author(db: AsyncSession, author_id: int):
     """
     Getting author by id.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
         author_id (int): id of author in db.
 
     Returns:
         item: author.
     """
 
-    return db.query(Author).where(Author.id == author_id).first()
+    return await db.scalar(select(Author)
+                           .options(*AUTHOR_OPTIONS)
+                           .where(Author.id == author_id))
 
 
-def get_book_list(db: Session):
+@track_queries
+async def get_book_list(db: AsyncSession):
     """
     Getting paginated list of all books in DB ordered by id.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
 
     Returns:
         list: books.
     """
 
-    return paginate(db, select(Book).order_by(Book.id))
+    return await paginate(db, select(Book)
+                          .options(*BOOK_LIST_OPTIONS)
+                          .order_by(Book.id))
 
 
-def get_book(db: Session, book_id: int):
+@track_queries
+async def get_book_cursor_list(db: AsyncSession):
+    """
+    Getting page of books by cursor (keyset pagination by id).
+    Every page costs the same regardless of depth,
+    count of books is approximate.
+
+    Args:
+        db (AsyncSession): database session.
+
+    Returns:
+        list: books.
+    """
+
+    return await paginate(db,
+                          select(Book)
+                          .options(*BOOK_LIST_OPTIONS)
+                          .order_by(Book.id),
+                          additional_data={
+                              'total': await get_approximate_count(db, Book)
+                          })
+
+
+@track_queries
+async def get_book(db: AsyncSession, book_id: int):
     """
     Getting book by id.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
         book_id (int): id of book in db.
 
     Returns:
         item: book.
     """
 
-    return db.query(Book).where(Book.id == book_id).first()
+    return await db.scalar(select(Book)
+                           .options(*BOOK_OPTIONS)
+                           .where(Book.id == book_id))
 
 
-def book_exists(db: Session, book_id: int):
+@track_queries
+async def book_exists(db: AsyncSession, book_id: int):
     """
     Checks if book with id exists in DB.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
         book_id (int): id of book in db.
 
     Returns:
         int: count of books(0 = doesn't exist, > 1 = exists).
     """
 
-    return db.query(Book).where(Book.id == book_id).count()
+    return await db.scalar(select(func.count(Book.id))
+                           .where(Book.id == book_id))
 
 
-def get_chapter_text(db: Session, book_id: int, chapter_number: int):
+@track_queries
+async def get_chapter_text(db: AsyncSession,
+                           book_id: int,
+                           chapter_number: int,
+                           offset: int = 0,
+                           length: int | None = None):
     """
-    Getting text of chapter by id.
+    Getting text of chapter by id with data for conditional requests.
+    Part of text is cut in DB, so rest of text isn't sent from it
+    (and compressed text is decompressed only up to end of part).
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
         book_id (int): id of book in db.
         chapter_number (int): chapter.number in db.
+        offset (int): count of characters to skip.
+        length (int): max count of characters (None = up to end).
 
     Returns:
-        tuple: contains one object (text of chapter).
+        row: text (or its part) and etag of chapter, time of adding book
+             (None if chapter doesn't exist).
+    """
+    text = Chapter.text
+    if length is not None:
+        text = func.substr(Chapter.text, offset + 1, length)
+    elif offset:
+        text = func.substr(Chapter.text, offset + 1)
+    result = await db.execute(select(text.label('text'),
+                                     Chapter.etag,
+                                     Book.added_at)
+                              .join(Book)
+                              .where(Chapter.book_id == book_id,
+                                     Chapter.number == chapter_number))
+
+    return result.first()
+
+
+@track_queries
+async def get_chapters_text(db: AsyncSession,
+                            book_id: int,
+                            chapter_numbers: list[int]):
     """
+    Getting texts of several chapters of book in one query
+    (numbers are passed as one array parameter).
+
+    Args:
+        db (AsyncSession): database session.
+        book_id (int): id of book in db.
+        chapter_numbers (list): chapter.number in db.
 
-    return db.execute(select(Chapter.text)
-                      .where(Chapter.book_id == book_id,
-                             Chapter.number == chapter_number)).scalar()
+    Returns:
+        list: rows with number, text and etag of chapter, time of adding
+              book (chapters which don't exist are skipped).
+    """
+    result = await db.execute(
+        select(Chapter.number, Chapter.text, Chapter.etag, Book.added_at)
+        .join(Book)
+        .where(Chapter.book_id == book_id,
+               Chapter.number == any_(literal(chapter_numbers,
+                                              ARRAY(Integer))))
+        .order_by(Chapter.number)
+    )
+
+    return result.all()
+
+
+@track_queries
+async def search_chapters(db: AsyncSession,
+                          query: str,
+                          limit: int,
+                          offset: int,
+                          *conditions):
+    """
+    Searching in chapters matching conditions by query.
+    Using tsquery, rank and headline. Everything is done in one query,
+    headlines are made only for chapters in requested page of results.
 
+    Args:
+        db (AsyncSession): database session.
+        query (str): text to search.
+        limit (int): max count of results.
+        offset (int): count of results to skip.
+        conditions: filters of chapters (e.g. by book_id).
 
-def search_in_book(db: Session, book_id: int, query: str):
+    Returns:
+        list(dict): results of search with book id, chapter number,
+                    rank and found results in it.
     """
-    Searching in book by query. Using tsquery and headline.
+    query_func = func.phraseto_tsquery(SEARCH_LANGUAGE, query)
+    rank = func.ts_rank_cd(Chapter.search_vector, query_func)
+    found = (select(Chapter.book_id,
+                    Chapter.number,
+                    Chapter.text,
+                    rank.label('rank'))
+             .where(*conditions)
+             .filter(Chapter.search_vector.op('@@')(query_func))
+             .order_by(rank.desc(), Chapter.book_id, Chapter.number)
+             .limit(limit)
+             .offset(offset)
+             .subquery())
+    results = (await db.execute(
+        select(found.c.book_id,
+               found.c.number,
+               found.c.rank,
+               func.ts_headline(SEARCH_LANGUAGE,
+                                found.c.text,
+                                query_func,
+                                HEADLINE_OPTIONS))
+        .order_by(found.c.rank.desc(),
+                  found.c.book_id,
+                  found.c.number))).all()
+
+    return [{'book_id': book_id,
+             'chapter_number': number,
+             'rank': rank,
+             'result': headline.replace('\n', ' ')}
+            for book_id, number, rank, headline in results]
+
+
+@track_queries
+async def search_in_book(db: AsyncSession,
+                         book_id: int,
+                         query: str,
+                         limit: int,
+                         offset: int):
+    """
+    Searching in book by query.
 
     Args:
-        db (Session): database session.
+        db (AsyncSession): database session.
         book_id (int): id of book in db.
         query (str): text to search in book.
+        limit (int): max count of results.
+        offset (int): count of results to skip.
 
     Returns:
-        list(dict): results of search with chapter number
-                    and found results in it.
-    """
-    query_func = func.phraseto_tsquery(query, postgresql_regconfig='russian')
-    results = db.execute(select(Chapter.number, Chapter.text)
-                         .where(Chapter.book_id == book_id)
-                         .filter(Chapter.text.op('@@')(query_func))).all()
-    final = []
-    if results:
-        res = [(c[0],
-                str(
-                db.query(func.ts_headline(
-                    'russian',
-                    c[1],
-                    query_func,
-                    'MaxFragments=2, '
-                    'MaxWords=20, '
-                    'StartSel="<<", '
-                    'StopSel=">>"'))
-                .first()).strip("(',)"))
-               for c in results]
-        final = [{'chapter_number': result[0],
-                  'result': result[1].replace('\\n', '')}
-                 for result in res]
-
-    return final
+        list(dict): results of search with chapter number,
+                    rank and found results in it.
+    """
+
+    return await search_chapters(db, query, limit, offset,
+                                 Chapter.book_id == book_id)
+
+
+@track_queries
+async def search_in_catalog(db: AsyncSession,
+                            query: str,
+                            limit: int,
+                            offset: int,
+                            author_ids: list[int] | None = None,
+                            book_ids: list[int] | None = None):
+    """
+    Searching in all books (or books of authors, or some books) by query.
+    GIN index on search_vector is used with or without filters.
+
+    Args:
+        db (AsyncSession): database session.
+        query (str): text to search.
+        limit (int): max count of results.
+        offset (int): count of results to skip.
+        author_ids (list): ids of authors of books to search in.
+        book_ids (list): ids of books to search in.
+
+    Returns:
+        list(dict): results of search with book id, chapter number,
+                    rank and found results in it.
+    """
+    conditions = []
+    if author_ids:
+        conditions.append(Chapter.book_id.in_(
+            select(Book.id).where(Book.author_id.in_(author_ids))
+        ))
+    if book_ids:
+        conditions.append(Chapter.book_id.in_(book_ids))
+
+    return await search_chapters(db, query, limit, offset, *conditions)
@@ -0,0 +1,237 @@
+import argparse
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.orm import selectinload
+
+from app.book_handler.add_book import get_book_etag
+from app.core.constants import SEARCH_LANGUAGE
+from app.db.database import SessionLocal, engine
+from app.db.models import CHAPTER_COMPRESSION, Author, Book, Chapter
+
+BATCH_SIZE = 500
+
+
+def backfill_search_vector(batch_size: int = BATCH_SIZE):
+    """
+    Adding search_vector column and GIN index to existing chapters table
+    and filling search_vector for rows added before it.
+    Rows are updated in batches, so table isn't locked for long time.
+
+    Args:
+        batch_size (int): count of chapters updated in one transaction.
+
+    Returns:
+        int: count of updated chapters.
+    """
+    # Only search index, unique one is built by index_chapters.
+    index = next(index for index in Chapter.__table__.indexes
+                 if index.name == 'ix_chapters_book_id_search_vector')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS btree_gin'))
+        conn.execute(text('ALTER TABLE chapters '
+                          'ADD COLUMN IF NOT EXISTS search_vector tsvector'))
+        index.create(conn, checkfirst=True)
+
+    updated = 0
+    with SessionLocal() as session:
+        while True:
+            batch = (select(Chapter.id)
+                     .where(Chapter.search_vector.is_(None))
+                     .limit(batch_size)
+                     .scalar_subquery())
+            result = session.execute(
+                update(Chapter)
+                .where(Chapter.id.in_(batch))
+                .values(search_vector=func.to_tsvector(SEARCH_LANGUAGE,
+                                                       Chapter.text))
+                .execution_options(synchronize_session=False))
+            session.commit()
+            if not result.rowcount:
+                break
+            updated += result.rowcount
+
+    return updated
+
+
+def compress_chapters(batch_size: int = BATCH_SIZE):
+    """
+    Setting CHAPTER_COMPRESSION for texts of chapters in existing table
+    and rewriting texts compressed with other method.
+    Postgres decompresses texts by itself, so nothing changes for reading.
+    It changes only speed of decompression, not size of table
+    (texts are already compressed with pglz by default).
+
+    Args:
+        batch_size (int): count of chapters checked in one transaction.
+
+    Returns:
+        int: count of rewritten chapters.
+    """
+    if not CHAPTER_COMPRESSION:
+
+        return 0
+
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE chapters ALTER COLUMN text '
+                          f'SET COMPRESSION {CHAPTER_COMPRESSION}'))
+
+    updated = 0
+    with SessionLocal() as session:
+        last_id = session.scalar(select(func.max(Chapter.id))) or 0
+        for start in range(0, last_id, batch_size):
+            result = session.execute(
+                update(Chapter)
+                .where(Chapter.id > start,
+                       Chapter.id <= start + batch_size,
+                       func.pg_column_compression(Chapter.text)
+                       != CHAPTER_COMPRESSION)
+                .values(text=Chapter.text + '')
+                .execution_options(synchronize_session=False))
+            session.commit()
+            updated += result.rowcount
+
+    return updated
+
+
+def backfill_etags(batch_size: int = BATCH_SIZE):
+    """
+    Adding etag and added_at columns to existing tables
+    and computing etags of chapters and books added before them.
+    ETags are the same as computed on adding book.
+
+    Args:
+        batch_size (int): count of chapters (or books)
+                          updated in one transaction.
+
+    Returns:
+        int: count of updated chapters and books.
+    """
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE chapters '
+                          'ADD COLUMN IF NOT EXISTS etag varchar'))
+        conn.execute(text('ALTER TABLE books '
+                          'ADD COLUMN IF NOT EXISTS etag varchar'))
+        conn.execute(text('ALTER TABLE books ADD COLUMN IF NOT EXISTS '
+                          'added_at timestamptz NOT NULL DEFAULT now()'))
+
+    updated = 0
+    with SessionLocal() as session:
+        while True:
+            batch = (select(Chapter.id)
+                     .where(Chapter.etag.is_(None))
+                     .limit(batch_size)
+                     .scalar_subquery())
+            result = session.execute(
+                update(Chapter)
+                .where(Chapter.id.in_(batch))
+                .values(etag=func.md5(Chapter.text))
+                .execution_options(synchronize_session=False))
+            session.commit()
+            if not result.rowcount:
+                break
+            updated += result.rowcount
+
+        while books := session.scalars(
+            select(Book)
+            .options(selectinload(Book.author).load_only(Author.name),
+                     selectinload(Book.chapters).load_only(Chapter.number,
+                                                           Chapter.name,
+                                                           Chapter.etag))
+            .where(Book.etag.is_(None))
+            .limit(batch_size)
+        ).all():
+            for book in books:
+                book.etag = get_book_etag(
+                    {'name': book.name},
+                    {'name': book.author.name},
+                    [{'number': chapter.number,
+                      'name': chapter.name,
+                      'etag': chapter.etag}
+                     for chapter in book.chapters]
+                )
+            session.commit()
+            updated += len(books)
+
+    return updated
+
+
+def reconcile_books_count():
+    """
+    Adding books_count column to existing authors table
+    and fixing stored counts of books which differ from real ones
+    (after adding or deleting books bypassing add_to_db).
+
+    Returns:
+        int: count of fixed authors.
+    """
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE authors ADD COLUMN IF NOT EXISTS '
+                          'books_count integer NOT NULL DEFAULT 0'))
+
+    real_count = (select(func.count(Book.id))
+                  .where(Book.author_id == Author.id)
+                  .scalar_subquery())
+    with SessionLocal() as session:
+        result = session.execute(
+            update(Author)
+            .where(Author.books_count != real_count)
+            .values(books_count=real_count)
+            .execution_options(synchronize_session=False))
+        session.commit()
+
+    return result.rowcount
+
+
+def index_chapters():
+    """
+    Adding unique index on chapters(book_id, number) to existing table.
+    Index is built concurrently, so chapters stay readable and writable.
+    Duplicated chapters must be removed before it.
+
+    Returns:
+        int: count of duplicated chapters (index isn't built if not 0).
+    """
+    index = next(index for index in Chapter.__table__.indexes
+                 if index.name == 'ix_chapters_book_id_number')
+    with SessionLocal() as session:
+        duplicates = session.scalar(
+            select(func.count())
+            .select_from(select(Chapter.book_id, Chapter.number)
+                         .group_by(Chapter.book_id, Chapter.number)
+                         .having(func.count() > 1)
+                         .subquery()))
+    if duplicates:
+
+        return duplicates
+
+    with engine.connect().execution_options(
+        isolation_level='AUTOCOMMIT'
+    ) as conn:
+        # Index left invalid by interrupted build isn't used, rebuilding it.
+        if conn.scalar(text('SELECT NOT indisvalid FROM pg_index '
+                            'WHERE indexrelid = to_regclass(:name)'),
+                       {'name': index.name}):
+            conn.execute(text(f'DROP INDEX CONCURRENTLY {index.name}'))
+        conn.execute(text(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {index.name} '
+            'ON chapters (book_id, number) INCLUDE (id, name)'
+        ))
+
+    return 0
+
+
+COMMANDS = {
+    'backfill-search-vector': backfill_search_vector,
+    'compress-chapters': compress_chapters,
+    'backfill-etags': backfill_etags,
+    'reconcile-books-count': reconcile_books_count,
+    'index-chapters': index_chapters,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DB maintenance commands.')
+    parser.add_argument('command', choices=COMMANDS)
+    args = parser.parse_args()
+
+    print(f'{args.command}: {COMMANDS[args.command]()}')
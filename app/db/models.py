@@ -1,8 +1,23 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Text, func, select
-from sqlalchemy.orm import column_property, relationship
+import os
+
+from sqlalchemy import (DDL, Column, DateTime, ForeignKey, Index, Integer,
+                        String, Text, event, func)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship
 
 from .database import Base
 
+# btree_gin allows to keep book_id and search_vector in one GIN index.
+event.listen(Base.metadata,
+             'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gin'))
+
+# Method of TOAST compression for texts of chapters ('lz4' or 'pglz'),
+# empty value keeps default method of DB. Long texts are compressed
+# with pglz anyway, lz4 is decompressed faster (reading of chapters,
+# headlines of search) but stores them a bit larger.
+CHAPTER_COMPRESSION = os.getenv('CHAPTER_COMPRESSION', 'lz4')
+
 
 class Book(Base):
     """
@@ -14,14 +29,22 @@ class Book(Base):
     chapters = relationship with Chapter model.
     author_id = id of author in Author model.
     author = relationship with Author model.
+    etag (str) = hash of book, its author and chapters.
+    added_at (datetime) = time of adding book.
     """
     __tablename__ = 'books'
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
-    chapters = relationship('Chapter', back_populates='book')
+    chapters = relationship('Chapter',
+                            back_populates='book',
+                            order_by='Chapter.number')
     author_id = Column(Integer, ForeignKey('authors.id'))
     author = relationship('Author', back_populates='books')
+    etag = Column(String)
+    added_at = Column(DateTime(timezone=True),
+                      server_default=func.now(),
+                      nullable=False)
 
 
 class Author(Base):
@@ -32,17 +55,17 @@ class Author(Base):
     id (int) = primary key.
     name (str) = name of author.
     books = relationship with Book model.
-    books_count (int) = total books of author.
+    books_count (int) = total books of author (maintained on adding books).
     """
     __tablename__ = 'authors'
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     books = relationship('Book', back_populates='author')
-    books_count = column_property(select(func.count(Book.id))
-                                  .where(Book.author_id == id)
-                                  .correlate_except(Book)
-                                  .scalar_subquery())
+    books_count = Column(Integer,
+                         nullable=False,
+                         default=0,
+                         server_default='0')
 
 
 class Chapter(Base):
@@ -53,15 +76,39 @@ class Chapter(Base):
     id (int) = primary key.
     number (int) = number of chapter in book.
     name (str) = name of chapter.
-    text (str) = text of chapter.
+    text (str) = text of chapter (compressed with CHAPTER_COMPRESSION).
+    search_vector (tsvector) = precomputed tsvector of text for search.
     book_id (int) = id of book in Book model.
     book = relationship with Book model.
+    etag (str) = hash of text of chapter.
     """
     __tablename__ = 'chapters'
+    __table_args__ = (
+        Index('ix_chapters_book_id_search_vector',
+              'book_id',
+              'search_vector',
+              postgresql_using='gin'),
+        # Chapter is found by book_id and number, list of chapters of book
+        # is read from index only (id and name are included).
+        Index('ix_chapters_book_id_number',
+              'book_id',
+              'number',
+              unique=True,
+              postgresql_include=['id', 'name']),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     number = Column(Integer, unique=False, nullable=False)
     name = Column(String, unique=False, nullable=False)
     text = Column(Text, nullable=False)
+    search_vector = Column(TSVECTOR)
     book_id = Column(Integer, ForeignKey('books.id'))
     book = relationship('Book', back_populates='chapters')
+    etag = Column(String)
+
+
+if CHAPTER_COMPRESSION:
+    event.listen(Chapter.__table__,
+                 'after_create',
+                 DDL('ALTER TABLE chapters ALTER COLUMN text '
+                     f'SET COMPRESSION {CHAPTER_COMPRESSION}'))
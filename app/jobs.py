@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi_cache import FastAPICache
+from sqlalchemy import exc
+
+from app.book_handler.add_book import add_to_db, get_book_content
+from app.book_handler.upload import BOOK_DIR
+from app.core.cache import invalidate_book
+from app.core.constants import (BOOK_ALREADY_EXISTS, BOOK_NOT_HANDLED,
+                                JOB_CANCELLED)
+from app.core.warmup import warm_up_book
+from app.schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', os.cpu_count()))
+JOB_EXPIRE = 60 * 60 * 24
+
+_executor: ProcessPoolExecutor | None = None
+_tasks: set[asyncio.Task] = set()
+_stopping = False
+
+
+def start_workers():
+    """
+    Starting pool of processes parsing books.
+    """
+    global _executor, _stopping
+    _stopping = False
+    _executor = ProcessPoolExecutor(
+        max_workers=INGEST_WORKERS,
+        mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+async def stop_workers():
+    """
+    Stopping pool of processes: queued jobs are cancelled
+    (and marked failed), running ones are waited for.
+    """
+    global _stopping
+    _stopping = True
+    _executor.shutdown(wait=False, cancel_futures=True)
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
+
+def job_key(job_id: str) -> str:
+    """
+    Key of job in redis.
+    """
+
+    return f'{FastAPICache.get_prefix()}:job:{job_id}'
+
+
+async def set_job(job_id: str, **fields):
+    """
+    Updating fields of job in redis.
+
+    Args:
+        job_id (str): id of job.
+        fields: fields of Job schema.
+    """
+    fields['id'] = job_id
+    redis = FastAPICache.get_backend().redis
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(job_key(job_id),
+                  mapping={key: getattr(value, 'value', value)
+                           for key, value in fields.items()})
+        pipe.expire(job_key(job_id), JOB_EXPIRE)
+        await pipe.execute()
+
+
+async def get_job(job_id: str) -> dict | None:
+    """
+    Getting job from redis.
+
+    Args:
+        job_id (str): id of job.
+
+    Returns:
+        dict: fields of job or None if job doesn't exist.
+    """
+    job = await FastAPICache.get_backend().redis.hgetall(job_key(job_id))
+
+    return {key.decode(): value.decode()
+            for key, value in job.items()} or None
+
+
+async def run_job(job_id: str, file_name: str):
+    """
+    Parsing book in pool of processes and adding it to DB,
+    cache of book is warmed up in background after it.
+    Status of job is updated on every stage.
+    File of book is removed in final.
+
+    Args:
+        job_id (str): id of job.
+        file_name (str): file name of book in BOOK_DIR.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await set_job(job_id, status=JobStatus.parsing)
+        if _stopping:
+            # Pool doesn't accept books anymore, job is cancelled as queued.
+
+            raise asyncio.CancelledError
+
+        book_obj, author_obj, chapters_obj = await loop.run_in_executor(
+            _executor, get_book_content, file_name
+        )
+
+        await set_job(job_id,
+                      status=JobStatus.saving,
+                      chapters=len(chapters_obj))
+        author_id, book_id = await run_in_threadpool(add_to_db,
+                                                     book_obj,
+                                                     author_obj,
+                                                     chapters_obj)
+        await invalidate_book(author_id, book_id)
+        warm_up_book(author_id, book_id)
+
+        await set_job(job_id, status=JobStatus.done, book_id=book_id)
+
+    except exc.IntegrityError:
+        await set_job(job_id,
+                      status=JobStatus.failed,
+                      detail=BOOK_ALREADY_EXISTS)
+
+    except asyncio.CancelledError:
+        await set_job(job_id,
+                      status=JobStatus.failed,
+                      detail=JOB_CANCELLED)
+
+        raise
+
+    except Exception:
+        logger.exception('Job %s failed', job_id)
+        await set_job(job_id,
+                      status=JobStatus.failed,
+                      detail=BOOK_NOT_HANDLED)
+
+    finally:
+        os.remove(os.path.join(BOOK_DIR, file_name))
+
+
+async def enqueue_book(file_name: str) -> dict:
+    """
+    Creating job for adding book and starting it in background.
+
+    Args:
+        file_name (str): file name of book in BOOK_DIR.
+
+    Returns:
+        dict: created job.
+    """
+    job_id = uuid.uuid4().hex
+    await set_job(job_id, status=JobStatus.queued)
+    task = asyncio.create_task(run_job(job_id, file_name))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+    return {'id': job_id, 'status': JobStatus.queued}
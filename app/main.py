@@ -1,69 +1,118 @@
 import os
 from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Annotated
 
-import aiofiles
 import redis.asyncio as redis
 from dotenv import load_dotenv
-from fastapi import (Depends, FastAPI, HTTPException, Path, Query, UploadFile,
-                     status)
-from fastapi.responses import PlainTextResponse
+from fastapi import (Depends, FastAPI, HTTPException, Path, Query, Request,
+                     UploadFile, status)
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
 from fastapi_pagination import add_pagination
-from sqlalchemy import exc
-from sqlalchemy.orm import Session
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.auth_admin import check_admin
-from app.book_handler.utils import CustomPage
-from app.core.cache import CustomORJsonCoder, custom_key_builder
-from app.core.constants import (BAD_FILE_FORMAT, BOOK_ALREADY_EXISTS,
+from app.book_handler.upload import BookSizeLimitMiddleware, save_upload
+from app.book_handler.utils import CustomCursorPage, CustomPage
+from app.core.cache import (AUTHOR_NAMESPACE, AUTHORS_NAMESPACE,
+                            BOOK_NAMESPACE, BOOKS_NAMESPACE, CACHE_PREFIX,
+                            LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL,
+                            CustomORJsonCoder, LocalCache, ResponseCoder,
+                            TieredRedisBackend, cache, cache_responses,
+                            custom_key_builder, get_cached_bodies)
+from app.core.compression import CompressionMiddleware
+from app.core.conditional import ConditionalGetMiddleware, immutable_headers
+from app.core.constants import (BAD_CURSOR, BAD_FILE_FORMAT,
+                                CHAPTERS_DEFAULT_COUNT, CHAPTERS_MAX_COUNT,
                                 NOT_FOUND_AUTHOR_ID, NOT_FOUND_BOOK_ID,
-                                NOT_FOUND_CHAPTER_NUMBER, RESPONSES)
+                                NOT_FOUND_CHAPTER_NUMBER, NOT_FOUND_JOB_ID,
+                                RESPONSES, SEARCH_DEFAULT_LIMIT,
+                                SEARCH_MAX_IDS, SEARCH_MAX_LIMIT,
+                                SEARCH_MAX_OFFSET, TOO_MANY_CHAPTERS,
+                                TOO_MANY_IDS)
+from app.core.metrics import LatencyMiddleware, update_pool_gauges
+from app.core.pools import create_redis_pool, db_pool_stats, redis_pool_stats
+from app.core.warmup import count_book_request, start_warm_up, stop_warm_up
 from app.db import crud, models
-from app.db.database import engine, get_db
-from app.new_book import add_new_book
+from app.db.database import async_engine, engine, get_db
+from app.jobs import enqueue_book, get_job, start_workers, stop_workers
 from app.schemas import (AuthorBooks, AuthorInfo, Book, BookChapters,
-                         SearchResults)
+                         ChapterText, Job, Message, PoolStats, SearchResults)
 
 load_dotenv()
 
+CACHE_EXPIRE = int(os.getenv('CACHE_EXPIRE', 60 * 60 * 24))
+
 models.Base.metadata.create_all(bind=engine)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    Adding pagination, connecting to redis on startup.
-    Flushing all in redis on shutdown.
+    Adding pagination, connecting to redis (with local cache in front),
+    starting workers for books and warm-up of cache on startup.
+    Stopping workers and warm-up, closing connection to redis on shutdown.
     """
     add_pagination(app)
-    pool = redis.ConnectionPool.from_url(os.getenv('REDIS_URL',
-                                                   'redis://book_api-redis'),
-                                         encoding='utf-8',
-                                         decode_responses=True)
+    start_workers()
+    pool = create_redis_pool()
+    app.state.redis_pool = pool
     r = redis.Redis(connection_pool=pool)
-    FastAPICache.init(RedisBackend(r),
-                      prefix='fastapi-cache',
+    backend = TieredRedisBackend(r, LocalCache(LOCAL_CACHE_SIZE,
+                                               LOCAL_CACHE_TTL))
+    backend.start()
+    FastAPICache.init(backend,
+                      prefix=CACHE_PREFIX,
+                      expire=CACHE_EXPIRE,
                       key_builder=custom_key_builder)
+    start_warm_up(app)
 
     yield
 
-    await r.flushall()
+    await stop_workers()
+    await stop_warm_up()
+    await backend.stop()
+    await pool.disconnect()
 
 
 app = FastAPI(lifespan=lifespan, title='book_api')
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(BookSizeLimitMiddleware, path='/books/')
+app.add_middleware(LatencyMiddleware)
 
 
 @app.get('/authors/',
          response_model=CustomPage[AuthorInfo],
          description='Full list of authors in DB with pagination.',
          tags=['Authors'])
-@cache()
-async def author_list(db: Session = Depends(get_db)):
+@cache(namespace=AUTHORS_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=CustomPage[AuthorInfo]))
+async def author_list(db: AsyncSession = Depends(get_db)):
+
+    return await crud.get_author_list(db)
+
 
-    return crud.get_author_list(db)
+@app.get('/authors/cursor/',
+         response_model=CustomCursorPage[AuthorInfo],
+         description=('List of authors in DB with cursor pagination. '
+                      'Use next_page as cursor to get next page, '
+                      'total is approximate.'),
+         tags=['Authors'])
+@cache(namespace=AUTHORS_NAMESPACE,
+       coder=CustomORJsonCoder(
+           response_model=CustomCursorPage[AuthorInfo]
+       ))
+async def author_cursor_list(db: AsyncSession = Depends(get_db)):
+    try:
+
+        return await crud.get_author_cursor_list(db)
+    except ValueError:
+
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=BAD_CURSOR)
 
 
 @app.get('/authors/{author_id}',
@@ -71,10 +120,11 @@ async def author_list(db: Session = Depends(get_db)):
          description='Author by ID.',
          tags=['Authors'],
          responses={**RESPONSES})
-@cache(coder=CustomORJsonCoder(response_model=AuthorBooks))
+@cache(namespace=AUTHOR_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=AuthorBooks))
 async def author_get(author_id: Annotated[int, Path(ge=0)],
-                     db: Session = Depends(get_db)):
-    author = crud.get_author(db, author_id=author_id)
+                     db: AsyncSession = Depends(get_db)):
+    author = await crud.get_author(db, author_id=author_id)
     if author is None:
 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
@@ -88,15 +138,42 @@ async def author_get(author_id: Annotated[int, Path(ge=0)],
          response_model=CustomPage[Book],
          description='Full list of books in DB with pagination.',
          tags=['Books'])
-@cache()
-async def book_list(db: Session = Depends(get_db)):
+@cache(namespace=BOOKS_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=CustomPage[Book]))
+async def book_list(db: AsyncSession = Depends(get_db)):
+
+    return await crud.get_book_list(db)
+
+
+@app.get('/books/cursor/',
+         response_model=CustomCursorPage[Book],
+         description=('List of books in DB with cursor pagination. '
+                      'Use next_page as cursor to get next page, '
+                      'total is approximate.'),
+         tags=['Books'])
+@cache(namespace=BOOKS_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=CustomCursorPage[Book]))
+async def book_cursor_list(db: AsyncSession = Depends(get_db)):
+    try:
+
+        return await crud.get_book_cursor_list(db)
+    except ValueError:
 
-    return crud.get_book_list(db)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=BAD_CURSOR)
 
 
 @app.post('/books/',
+          response_model=Job,
+          status_code=status.HTTP_202_ACCEPTED,
           dependencies=[Depends(check_admin)],
-          description='Add .epub book to DB (only for admin).',
+          description=('Add .epub book to DB (only for admin). '
+                       'Book is handled in background, '
+                       'use returned job id to check status.'),
+          responses={411: {'model': Message,
+                           'description': 'Content-Length is required'},
+                     413: {'model': Message,
+                           'description': 'Book is too large'}},
           tags=['Books'])
 async def book_add(book: UploadFile):
     if book.content_type != 'application/epub+zip':
@@ -104,80 +181,248 @@ async def book_add(book: UploadFile):
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                             detail=BAD_FILE_FORMAT)
 
-    async with aiofiles.open(f'book/{book.filename}', 'wb') as out_file:
-        content = await book.read()
+    file_name = await save_upload(book)
 
-        await out_file.write(content)
+    return await enqueue_book(file_name)
 
-    try:
-        result = add_new_book(book.filename)
-        await redis.Redis.from_url(os.getenv('REDIS_URL')).flushall()
 
-        return result
+@app.get('/jobs/{job_id}',
+         response_model=Job,
+         dependencies=[Depends(check_admin)],
+         description='Status of adding book by job ID (only for admin).',
+         tags=['Jobs'],
+         responses={**RESPONSES})
+async def job_get(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
 
-    except exc.IntegrityError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=NOT_FOUND_JOB_ID.format(job_id=job_id))
+
+    return job
 
-        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                            detail=BOOK_ALREADY_EXISTS)
 
-    finally:
-        os.remove(f'book/{book.filename}')
+@app.get('/stats/pools',
+         response_model=dict[str, PoolStats],
+         dependencies=[Depends(check_admin)],
+         description=('Stats of pools of connections of this worker '
+                      'to DB (API and adding books) and Redis '
+                      '(only for admin).'),
+         tags=['Stats'])
+async def pools_stats(request: Request):
+
+    return {'db': db_pool_stats(async_engine),
+            'db_sync': db_pool_stats(engine),
+            'redis': redis_pool_stats(request.app.state.redis_pool)}
+
+
+@app.get('/metrics',
+         response_class=PlainTextResponse,
+         dependencies=[Depends(check_admin)],
+         description=('Metrics of this worker in Prometheus format: '
+                      'latency of routes, DB queries and cache, '
+                      'hits and misses of cache, pools of connections '
+                      '(only for admin).'),
+         tags=['Stats'])
+async def metrics(request: Request):
+    update_pool_gauges(await pools_stats(request))
+
+    return Response(generate_latest(),
+                    headers={'Content-Type': CONTENT_TYPE_LATEST})
 
 
 @app.get('/books/{book_id}',
          response_model=BookChapters,
-         description='Book by ID.',
+         dependencies=[Depends(count_book_request)],
+         description=('Book by ID. '
+                      'Supports conditional requests (If-None-Match).'),
          tags=['Books'],
          responses={**RESPONSES})
-@cache(coder=CustomORJsonCoder(response_model=BookChapters))
+@cache(namespace=BOOK_NAMESPACE, coder=ResponseCoder)
 async def book_get(book_id: Annotated[int, Path(ge=0)],
-                   db: Session = Depends(get_db)):
-    book = crud.get_book(db, book_id=book_id)
+                   db: AsyncSession = Depends(get_db)):
+    book = await crud.get_book(db, book_id=book_id)
     if book is None:
 
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=NOT_FOUND_BOOK_ID.format(book_id=book_id))
 
-    return book
+    return ORJSONResponse(BookChapters.from_orm(book).dict(),
+                          headers=immutable_headers(book.etag,
+                                                    book.added_at))
 
 
 @app.get('/books/{book_id}/chapter/{chapter_number}',
          response_class=PlainTextResponse,
-         description='Chapter text by book_id and chapter_number.',
+         dependencies=[Depends(count_book_request)],
+         description=('Chapter text by book_id and chapter_number. '
+                      'Use offset and length (in characters) '
+                      'to get part of text. '
+                      'Supports conditional requests (If-None-Match).'),
          tags=['Books'],
          responses={**RESPONSES,
                     200: {'content': {'text/plain': {}},
                           'description': 'Returns text of chapter.'}})
-@cache()
+@cache(namespace=BOOK_NAMESPACE, coder=ResponseCoder)
 async def chapter_get(book_id: Annotated[int, Path(ge=0)],
                       chapter_number: Annotated[int, Path(ge=0)],
-                      db: Session = Depends(get_db)):
-    if not crud.book_exists(db, book_id):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=NOT_FOUND_BOOK_ID.format(book_id=book_id))
-
-    chapter = crud.get_chapter_text(db, book_id, chapter_number)
+                      offset: Annotated[int, Query(ge=0)] = 0,
+                      length: Annotated[int | None, Query(ge=1)] = None,
+                      db: AsyncSession = Depends(get_db)):
+    chapter = await crud.get_chapter_text(db,
+                                          book_id,
+                                          chapter_number,
+                                          offset,
+                                          length)
+
+    if chapter is None:
+        if not await crud.book_exists(db, book_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=NOT_FOUND_BOOK_ID.format(
+                                    book_id=book_id))
 
-    if not chapter:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=NOT_FOUND_CHAPTER_NUMBER.format(
                                 chapter_number=chapter_number,
                                 book_id=book_id))
 
-    return chapter
+    etag = chapter.etag
+    if etag is not None and (offset or length is not None):
+        etag = f'{etag}-{offset}-{length or ""}'
+
+    return chapter_response(chapter.text, etag, chapter.added_at)
+
+
+def chapter_response(text: str, etag: str | None,
+                     added_at: datetime) -> PlainTextResponse:
+    """
+    Response of chapter_get with text of chapter.
+    """
+
+    return PlainTextResponse(text,
+                             headers=immutable_headers(etag, added_at))
+
+
+@app.get('/books/{book_id}/chapters/',
+         response_model=list[ChapterText],
+         dependencies=[Depends(count_book_request)],
+         description=('Texts of several chapters of book: '
+                      'chosen by number (can be repeated) '
+                      'or range from start (count chapters). '
+                      'Chapters which don\'t exist are skipped.'),
+         tags=['Books'],
+         responses={**RESPONSES,
+                    422: {'model': Message,
+                          'description': 'Too many chapters'}})
+async def chapters_get(book_id: Annotated[int, Path(ge=0)],
+                       number: Annotated[list[int] | None, Query()] = None,
+                       start: Annotated[int, Query(ge=0)] = 0,
+                       count: Annotated[int, Query(
+                           ge=1,
+                           le=CHAPTERS_MAX_COUNT)] = CHAPTERS_DEFAULT_COUNT,
+                       db: AsyncSession = Depends(get_db)):
+    numbers = (list(dict.fromkeys(number)) if number
+               else list(range(start, start + count)))
+    if len(numbers) > CHAPTERS_MAX_COUNT:
+
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail=TOO_MANY_CHAPTERS.format(
+                                max_count=CHAPTERS_MAX_COUNT))
+
+    # Chapters are read from cache of chapter_get and missing ones
+    # are cached for it, so prefetched chapters are cached for both.
+    kwargs_list = [{'book_id': book_id,
+                    'chapter_number': chapter_number,
+                    'offset': 0,
+                    'length': None} for chapter_number in numbers]
+    bodies = await get_cached_bodies(chapter_get, BOOK_NAMESPACE, kwargs_list)
+    texts = {chapter_number: body.decode()
+             for chapter_number, body in zip(numbers, bodies)
+             if body is not None}
+    missing = [chapter_number for chapter_number in numbers
+               if chapter_number not in texts]
+    if missing:
+        chapters = await crud.get_chapters_text(db, book_id, missing)
+        if (not chapters and not texts
+                and not await crud.book_exists(db, book_id)):
+
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=NOT_FOUND_BOOK_ID.format(
+                                    book_id=book_id))
+
+        await cache_responses(
+            chapter_get,
+            BOOK_NAMESPACE,
+            [kwargs_list[numbers.index(chapter.number)]
+             for chapter in chapters],
+            [chapter_response(chapter.text, chapter.etag, chapter.added_at)
+             for chapter in chapters]
+        )
+        texts.update((chapter.number, chapter.text) for chapter in chapters)
+
+    return ORJSONResponse([{'number': chapter_number,
+                            'text': texts[chapter_number]}
+                           for chapter_number in numbers
+                           if chapter_number in texts])
 
 
 @app.get('/books/{book_id}/search/',
          response_model=list[SearchResults],
-         description='Search query in book by ID.',
+         description=('Search query in book by ID. '
+                      'Results are ordered by rank, use limit and offset '
+                      'to get next results.'),
          tags=['Books'],
          responses={**RESPONSES})
-@cache()
+@cache(namespace=BOOK_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=list[SearchResults]))
 async def book_search(book_id: Annotated[int, Path(ge=0)],
                       query: Annotated[str, Query(min_length=3)],
-                      db: Session = Depends(get_db)):
-    if not crud.book_exists(db, book_id):
+                      limit: Annotated[int, Query(
+                          ge=1,
+                          le=SEARCH_MAX_LIMIT)] = SEARCH_DEFAULT_LIMIT,
+                      offset: Annotated[int, Query(ge=0)] = 0,
+                      db: AsyncSession = Depends(get_db)):
+    if not await crud.book_exists(db, book_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=NOT_FOUND_BOOK_ID.format(book_id=book_id))
 
-    return crud.search_in_book(db, book_id, query)
+    return await crud.search_in_book(db, book_id, query, limit, offset)
+
+
+@app.get('/search/',
+         response_model=list[SearchResults],
+         description=('Search query in all books, '
+                      'or in books of authors (author_id) '
+                      'and chosen books (book_id). '
+                      'Results are ordered by rank, use limit and offset '
+                      'to get next results.'),
+         tags=['Search'])
+@cache(namespace=BOOKS_NAMESPACE,
+       coder=CustomORJsonCoder(response_model=list[SearchResults]))
+async def catalog_search(query: Annotated[str, Query(min_length=3)],
+                         author_id: Annotated[list[int] | None,
+                                              Query()] = None,
+                         book_id: Annotated[list[int] | None,
+                                            Query()] = None,
+                         limit: Annotated[int, Query(
+                             ge=1,
+                             le=SEARCH_MAX_LIMIT)] = SEARCH_DEFAULT_LIMIT,
+                         offset: Annotated[int, Query(
+                             ge=0,
+                             le=SEARCH_MAX_OFFSET)] = 0,
+                         db: AsyncSession = Depends(get_db)):
+    for name, ids in (('author_id', author_id), ('book_id', book_id)):
+        if ids is not None and len(ids) > SEARCH_MAX_IDS:
+
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=TOO_MANY_IDS.format(max_count=SEARCH_MAX_IDS,
+                                           name=name)
+            )
+
+    return await crud.search_in_catalog(db,
+                                        query,
+                                        limit,
+                                        offset,
+                                        author_ids=author_id,
+                                        book_ids=book_id)
@@ -1,3 +1,5 @@
+from enum import Enum
+
 from pydantic import BaseModel
 
 
@@ -74,14 +76,60 @@ class AuthorBooks(Author):
         orm_mode = True
 
 
+class ChapterText(BaseModel):
+    """
+    Schema of text of chapter
+    in /books/{book_id}/chapters/ endpoint.
+    """
+    number: int
+    text: str
+
+
 class SearchResults(BaseModel):
     """
-    Schema for displaing search results in /books/{book_id}/search/ endpoint.
+    Schema for displaing search results
+    in /books/{book_id}/search/ and /search/ endpoints.
     """
+    book_id: int
     chapter_number: int
+    rank: float
     result: str
 
 
+class JobStatus(str, Enum):
+    """
+    Stages of book ingestion job.
+    """
+    queued = 'queued'
+    parsing = 'parsing'
+    saving = 'saving'
+    done = 'done'
+    failed = 'failed'
+
+
+class Job(BaseModel):
+    """
+    Schema of book ingestion job for using in /books/ and /jobs/{job_id}.
+    """
+    id: str
+    status: JobStatus
+    chapters: int | None = None
+    book_id: int | None = None
+    detail: str | None = None
+
+
+class PoolStats(BaseModel):
+    """
+    Schema of stats of pool of connections for using in /stats/pools.
+    """
+    size: int
+    in_use: int
+    overflow: int
+    waits: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+
+
 class Message(BaseModel):
     """
     Schema for displaing error messages in docs.
@@ -0,0 +1,108 @@
+"""
+Benchmark of book_handler.add_book.get_book_content
+on synthetic 500-chapter book.
+
+Compares current implementation with previous one
+(BeautifulSoup, label lookup for every chapter, file parsed per chapter).
+Run from root of project: python -m benchmarks.bench_book_content
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import time
+from unicodedata import normalize
+
+import ebooklib
+from ebooklib import epub
+
+from app.book_handler.add_book import get_book_content
+from benchmarks.synthetic import make_epub
+
+BOOK_NAME = 'bench_500_chapters.epub'
+
+
+def legacy_get_book_content(book_name: str) -> tuple[dict, dict, tuple]:
+    """
+    Previous implementation of get_book_content, kept as baseline.
+    """
+    from bs4 import BeautifulSoup
+
+    book = epub.read_epub(f'book/{book_name}', options={'ignore_ncx': True})
+    book_obj = {'name': book.get_metadata('DC', 'title')[0][0]}
+    author_obj = {'name': book.get_metadata('DC', 'creator')[0][0]}
+    navs = list(book.get_items_of_type(ebooklib.ITEM_NAVIGATION))
+    decoded_nav = navs[0].get_content().decode('utf-8')
+    decoded_nav = ' '.join(decoded_nav.split())
+    soup = BeautifulSoup(decoded_nav, 'xml')
+    navlabels = soup.find_all('navLabel')
+    labels = [navlabel.text.strip() for navlabel in navlabels]
+    paths = [soup.find(string=label)
+             .find_parent('navPoint')
+             .find('content')['src']
+             for label in labels]
+    chapters_text = []
+    for path in paths:
+        src_id = path.split('#')
+        chapter = book.get_item_with_href(src_id[0])
+        decoded_chap = chapter.get_content().decode('utf-8')
+        s = BeautifulSoup(decoded_chap, 'xml')
+        chapters_text.append(re.sub(r'\n+', '\n',
+                             (s.find(id=src_id[1])
+                              .get_text(separator='\n')
+                              .strip())))
+    chapters_obj = tuple([{'number': num,
+                           'name': label,
+                           'text': normalize('NFKD', chapters_text[num])}
+                         for num, label in enumerate(labels)])
+
+    return book_obj, author_obj, chapters_obj
+
+
+def measure(func, repeat: int) -> list[float]:
+    """
+    Timings of func(BOOK_NAME) in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(BOOK_NAME)
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chapters', type=int, default=500)
+    parser.add_argument('--chapters-per-file', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.makedirs('book', exist_ok=True)
+    path = os.path.join('book', BOOK_NAME)
+    make_epub(path,
+              title='Синтетическая книга',
+              author='Бенчмарк',
+              chapters=args.chapters,
+              chapters_per_file=args.chapters_per_file)
+    try:
+        _, _, chapters = get_book_content(BOOK_NAME)
+        _, _, legacy_chapters = legacy_get_book_content(BOOK_NAME)
+        assert ([(chapter['name'], chapter['text']) for chapter in chapters]
+                == [(chapter['name'], chapter['text'])
+                    for chapter in legacy_chapters]), (
+            'Results of implementations differ.'
+        )
+        results = {name: statistics.median(measure(func, args.repeat))
+                   for name, func in (('legacy', legacy_get_book_content),
+                                      ('current', get_book_content))}
+    finally:
+        os.remove(path)
+        if not os.listdir('book'):
+            shutil.rmtree('book')
+
+    for name, seconds in results.items():
+        print(f'{name:>8}: {seconds:.3f} s (median of {args.repeat})')
+    print(f' speedup: {results["legacy"] / results["current"]:.1f}x')
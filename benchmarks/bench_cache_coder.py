@@ -0,0 +1,143 @@
+"""
+Benchmark of cache hit of JSON endpoints (app.core.cache.CustomORJsonCoder)
+on synthetic author with many books and search results.
+
+Compares current coder (cached JSON body returned as ready Response)
+with previous one (cached JSON decoded, then validated and serialized
+by response_model in FastAPI on every hit).
+Run from root of project: python -m benchmarks.bench_cache_coder
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from fastapi_cache import Coder
+from starlette.responses import Response
+
+from app.core.cache import CustomORJsonCoder
+from app.schemas import AuthorBooks, SearchResults
+from benchmarks.synthetic import WORDS, sentence
+
+
+class LegacyORJsonCoder(Coder):
+    """
+    Previous implementation of CustomORJsonCoder, kept as baseline.
+    """
+    def __init__(self, response_model) -> None:
+        self.response_model = response_model
+
+    def encode(self, value: any) -> bytes:
+        return orjson.dumps(
+            self.response_model.from_orm(value),
+            default=jsonable_encoder,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+    @classmethod
+    def decode(cls, value: bytes) -> any:
+        return orjson.loads(value)
+
+
+def make_payloads(books: int, results: int) -> dict:
+    """
+    Synthetic results of endpoints: ORM-like author with books
+    and list of search results.
+    """
+    rnd = random.Random(0)
+    author = SimpleNamespace(
+        id=1,
+        name='Бенчмарк',
+        books=[SimpleNamespace(id=num, name=' '.join(rnd.choices(WORDS, k=4)))
+               for num in range(books)]
+    )
+    search = [{'book_id': 1,
+               'chapter_number': num,
+               'rank': rnd.random(),
+               'result': ' ... '.join(sentence(rnd) for _ in range(2))}
+              for num in range(results)]
+
+    return {'author': (AuthorBooks, author),
+            'search': (list[SearchResults], search)}
+
+
+async def hit(coder: Coder, cached: bytes, field) -> Response:
+    """
+    What happens on cache hit: decoding cached value
+    and making response as FastAPI does.
+    """
+    value = coder.decode(cached)
+    if isinstance(value, Response):
+
+        return value
+
+    content = await serialize_response(field=field,
+                                       response_content=value,
+                                       is_coroutine=True)
+
+    return JSONResponse(content)
+
+
+async def measure(coder: Coder, cached: bytes, field,
+                  count: int) -> float:
+    """
+    Time of count hits in seconds.
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        await hit(coder, cached, field)
+
+    return time.perf_counter() - start
+
+
+async def main(args):
+    for name, (model, value) in make_payloads(args.books,
+                                              args.results).items():
+        field = create_response_field(name=f'Response_{name}', type_=model)
+        coders = {'legacy': LegacyORJsonCoder(model),
+                  'current': CustomORJsonCoder(model)}
+        if name == 'search':
+            # Legacy coder can't validate list by from_orm, it used
+            # default coder of fastapi_cache (json) for such endpoints.
+            coders['legacy'].encode = lambda value: orjson.dumps(value)
+        cached = {coder_name: coder.encode(value)
+                  for coder_name, coder in coders.items()}
+        bodies = {coder_name: (await hit(coder,
+                                         cached[coder_name],
+                                         field)).body
+                  for coder_name, coder in coders.items()}
+        assert (orjson.loads(bodies['legacy'])
+                == orjson.loads(bodies['current'])), (
+            'Responses of coders differ.'
+        )
+
+        results = {}
+        for coder_name, coder in coders.items():
+            timings = [await measure(coder,
+                                     cached[coder_name],
+                                     field,
+                                     args.hits)
+                       for _ in range(args.repeat)]
+            results[coder_name] = statistics.median(timings) / args.hits
+
+        print(f'{name} ({len(bodies["current"])} bytes):')
+        for coder_name, seconds in results.items():
+            print(f'{coder_name:>8}: {seconds * 1e6:.1f} us per hit, '
+                  f'{1 / seconds:.0f} hits/s (median of {args.repeat})')
+        print(f' speedup: {results["legacy"] / results["current"]:.1f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--results', type=int, default=10)
+    parser.add_argument('--hits', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
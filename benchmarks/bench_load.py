@@ -0,0 +1,261 @@
+"""
+Load test of hot paths of API on synthetic catalog.
+
+Seeds DB with synthetic catalog (authors, books with russian-like
+chapters) by bulk import, then sends requests to running API
+(list of authors, book, chapter, several chapters, search in book
+and in catalog) with every concurrency level, first with cold cache
+(namespaces of requested keys invalidated), then with warm one
+(the same requests again). Latency percentiles and throughput
+are written to JSON file, which can be compared with previous run.
+
+API has to use the same DB_URL and REDIS_URL as this script
+(e.g. uvicorn app.main:app with the same .env, local Postgres
+and Redis or their fakes).
+Run from root of project:
+python -m benchmarks.bench_load --output new.json [--compare old.json]
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import aiohttp
+from sqlalchemy import select
+
+from app.book_handler.bulk_add import invalidate_cache, write_batch
+from app.db import models
+from app.db.database import SessionLocal, engine
+from benchmarks.synthetic import WORDS, make_book_content
+
+TITLE_PREFIX = 'Бенчмарк'
+AUTHORS_PAGE_SIZE = 10
+SCENARIOS = ('authors', 'book', 'chapter', 'chapters', 'book_search',
+             'catalog_search')
+QUERIES = tuple(word for word in WORDS if len(word) >= 3)
+
+
+def seed_catalog(authors: int, books: int, chapters: int,
+                 paragraphs: int, batch_size: int) -> int:
+    """
+    Adding synthetic books (with their authors) to DB,
+    books which are already there are skipped.
+
+    Returns:
+        int: count of added books.
+    """
+    models.Base.metadata.create_all(bind=engine)
+    added = []
+    for first in range(0, books, batch_size):
+        batch = [make_book_content(f'{TITLE_PREFIX} {num}',
+                                   f'{TITLE_PREFIX} Автор {num % authors}',
+                                   chapters=chapters,
+                                   paragraphs=paragraphs)
+                 for num in range(first, min(books, first + batch_size))]
+        added.extend(write_batch(batch)[0])
+    if added:
+        invalidate_cache(added)
+
+    return len(added)
+
+
+def get_catalog() -> list[tuple[int, int]]:
+    """
+    Ids of authors with ids of synthetic books.
+    """
+    with SessionLocal() as session:
+
+        return session.execute(
+            select(models.Book.author_id, models.Book.id)
+            .where(models.Book.name.startswith(TITLE_PREFIX))
+            .order_by(models.Book.id)
+        ).all()
+
+
+def make_paths(scenario: str, catalog: list, chapters: int,
+               count: int, rnd: random.Random) -> list[str]:
+    """
+    Paths of requests of scenario, ids are spread over whole catalog.
+    """
+    authors = len({author_id for author_id, _ in catalog})
+    pages = max(math.ceil(authors / AUTHORS_PAGE_SIZE), 1)
+    book_ids = [book_id for _, book_id in catalog]
+    paths = []
+    for _ in range(count):
+        book_id = rnd.choice(book_ids)
+        query = rnd.choice(QUERIES)
+        paths.append({
+            'authors': (f'/authors/?page={rnd.randint(1, pages)}'
+                        f'&size={AUTHORS_PAGE_SIZE}'),
+            'book': f'/books/{book_id}',
+            'chapter': (f'/books/{book_id}/chapter/'
+                        f'{rnd.randrange(chapters)}'),
+            'chapters': (f'/books/{book_id}/chapters/'
+                         f'?start={rnd.randrange(chapters)}&count=5'),
+            'book_search': f'/books/{book_id}/search/?query={query}',
+            'catalog_search': (f'/search/?query={query}'
+                               f'&offset={rnd.randrange(0, 50, 10)}'),
+        }[scenario])
+
+    return paths
+
+
+async def send(session: aiohttp.ClientSession, url: str,
+               paths: list[str], concurrency: int) -> dict:
+    """
+    Sending requests by concurrency workers.
+
+    Returns:
+        dict: percentiles and mean of latency in ms, throughput,
+              count of requests and errors.
+    """
+    pending = iter(paths)
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for path in pending:
+            start = time.perf_counter()
+            try:
+                async with session.get(url + path) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100, method='inclusive')
+
+    return {'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': percentiles[49] * 1000,
+            'p95_ms': percentiles[94] * 1000,
+            'p99_ms': percentiles[98] * 1000,
+            'mean_ms': statistics.fmean(latencies) * 1000,
+            'rps': len(latencies) / seconds}
+
+
+def git_commit() -> str | None:
+    """
+    Current commit of project, to know what was measured.
+    """
+    try:
+
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+
+        return None
+
+
+def compare(results: list[dict], path: str):
+    """
+    Printing changes of p95 and throughput against previous run.
+    """
+    with open(path) as file:
+        previous = {(item['scenario'], item['concurrency'], item['cache']):
+                    item
+                    for item in json.load(file)['results']}
+    print(f'\ncompared with {path}:')
+    for item in results:
+        old = previous.get((item['scenario'],
+                            item['concurrency'],
+                            item['cache']))
+        if old is None:
+            continue
+        print(f'{item["scenario"]:>15} c={item["concurrency"]:<4} '
+              f'{item["cache"]:<5} '
+              f'p95 {old["p95_ms"]:8.1f} -> {item["p95_ms"]:8.1f} ms, '
+              f'rps {old["rps"]:8.1f} -> {item["rps"]:8.1f}')
+
+
+async def main(args):
+    if not args.skip_seed:
+        start = time.perf_counter()
+        added = seed_catalog(args.authors, args.books, args.chapters,
+                             args.paragraphs, args.batch_size)
+        print(f'seeded {added} books in '
+              f'{time.perf_counter() - start:.1f} s')
+    catalog = get_catalog()
+    assert catalog, 'No synthetic books in DB, run without --skip-seed.'
+
+    rnd = random.Random(args.seed)
+    results = []
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+    async with aiohttp.ClientSession(timeout=timeout,
+                                     connector=connector) as session:
+        for concurrency in args.concurrency:
+            for scenario in args.scenarios:
+                paths = make_paths(scenario, catalog, args.chapters,
+                                   args.requests, rnd)
+                invalidate_cache(catalog)
+                for cache_state in ('cold', 'warm'):
+                    stats = await send(session, args.url, paths, concurrency)
+                    results.append({'scenario': scenario,
+                                    'concurrency': concurrency,
+                                    'cache': cache_state,
+                                    **stats})
+                    print(f'{scenario:>15} c={concurrency:<4} '
+                          f'{cache_state:<5} '
+                          f'p50 {stats["p50_ms"]:8.1f} '
+                          f'p95 {stats["p95_ms"]:8.1f} '
+                          f'p99 {stats["p99_ms"]:8.1f} ms, '
+                          f'{stats["rps"]:8.1f} req/s, '
+                          f'errors {stats["errors"]}')
+
+    with open(args.output, 'w') as file:
+        json.dump({'meta': {'date': datetime.now(timezone.utc).isoformat(),
+                            'commit': git_commit(),
+                            'python': platform.python_version(),
+                            'url': args.url,
+                            'books': len(catalog),
+                            'chapters': args.chapters,
+                            'requests': args.requests,
+                            'seed': args.seed},
+                   'results': results},
+                  file,
+                  ensure_ascii=False,
+                  indent=2)
+    print(f'results are written to {args.output}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--authors', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=3000)
+    parser.add_argument('--chapters', type=int, default=5)
+    parser.add_argument('--paragraphs', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--skip-seed', action='store_true')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='requests of every scenario and level')
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=list(SCENARIOS))
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_load.json')
+    parser.add_argument('--compare', help='JSON file of previous run')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+import random
+from unicodedata import normalize
+
+from ebooklib import epub
+
+from app.book_handler.add_book import get_book_etag, get_etag
+
+WORDS = ('князь андрей пьер наташа ростов болконский москва петербург '
+         'армия война мир солдат офицер генерал кутузов наполеон поле '
+         'сражение небо облако дорога лошадь карета бал гостиная письмо '
+         'любовь смерть жизнь душа сердце мысль слово ответ вопрос '
+         'сказал подумал посмотрел улыбнулся вошёл вышел молчал знал '
+         'старый молодой высокий тихий светлый тёмный долгий последний '
+         'и в не на что с как он она они но его её было был была').split()
+
+
+def sentence(rnd: random.Random) -> str:
+    """
+    Random russian-like sentence.
+    """
+    words = rnd.choices(WORDS, k=rnd.randint(6, 18))
+
+    return ' '.join(words).capitalize() + rnd.choice('...!?')
+
+
+def paragraph(rnd: random.Random) -> str:
+    """
+    Random paragraph of several sentences.
+    """
+
+    return ' '.join(sentence(rnd) for _ in range(rnd.randint(3, 8)))
+
+
+def chapter_text(rnd: random.Random, paragraphs: int) -> str:
+    """
+    Random text of chapter.
+    """
+
+    return '\n'.join(paragraph(rnd) for _ in range(paragraphs))
+
+
+def make_epub(path: str,
+              title: str,
+              author: str,
+              chapters: int = 20,
+              paragraphs: int = 30,
+              chapters_per_file: int = 1,
+              seed: int = 0):
+    """
+    Writing synthetic .epub book with NCX navigation,
+    every chapter is referenced by anchor in its file.
+
+    Args:
+        path (str): path of new file.
+        title (str): name of book.
+        author (str): name of author.
+        chapters (int): count of chapters.
+        paragraphs (int): count of paragraphs in chapter.
+        chapters_per_file (int): count of chapters in one xhtml file.
+        seed (int): seed of random text.
+    """
+    rnd = random.Random(f'{seed}:{title}')
+    book = epub.EpubBook()
+    book.set_identifier(f'synthetic-{seed}-{title}')
+    book.set_title(title)
+    book.set_language('ru')
+    book.add_author(author)
+    toc = []
+    spine = []
+    for first in range(0, chapters, chapters_per_file):
+        file_name = f'part_{first}.xhtml'
+        body = []
+        for num in range(first, min(chapters, first + chapters_per_file)):
+            text = ''.join(f'<p>{line}</p>'
+                           for line in chapter_text(rnd,
+                                                    paragraphs).split('\n'))
+            body.append(f'<div id="chapter_{num}">'
+                        f'<h2>Глава {num + 1}</h2>{text}</div>')
+            toc.append(epub.Link(f'{file_name}#chapter_{num}',
+                                 f'Глава {num + 1}',
+                                 f'chapter_{num}'))
+        item = epub.EpubHtml(title=file_name, file_name=file_name, lang='ru')
+        item.content = f'<html><body>{"".join(body)}</body></html>'
+        book.add_item(item)
+        spine.append(item)
+    book.toc = toc
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = ['nav', *spine]
+    epub.write_epub(path, book)
+
+
+def make_book_content(title: str,
+                      author: str,
+                      chapters: int = 20,
+                      paragraphs: int = 30,
+                      seed: int = 0) -> tuple[dict, dict, tuple]:
+    """
+    Synthetic content of book in format of get_book_content
+    (without writing and parsing .epub), for seeding DB.
+
+    Args:
+        title (str): name of book.
+        author (str): name of author.
+        chapters (int): count of chapters.
+        paragraphs (int): count of paragraphs in chapter.
+        seed (int): seed of random text.
+
+    Returns:
+        tuple: book_obj, author_obj, chapters_obj.
+    """
+    rnd = random.Random(f'{seed}:{title}')
+    book_obj = {'name': title}
+    author_obj = {'name': author}
+    chapters_obj = []
+    for num in range(chapters):
+        text = normalize('NFKD', chapter_text(rnd, paragraphs))
+        chapters_obj.append({'number': num,
+                             'name': f'Глава {num + 1}',
+                             'text': text,
+                             'etag': get_etag(text)})
+    book_obj['etag'] = get_book_etag(book_obj, author_obj, chapters_obj)
+
+    return book_obj, author_obj, tuple(chapters_obj)
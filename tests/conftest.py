@@ -0,0 +1,9 @@
+import os
+
+# Warm-up of cache would query DB in background while queries are counted.
+os.environ['WARMUP_PAGES'] = '0'
+os.environ['WARMUP_BOOKS'] = '0'
+# App is imported by tests with their own DB, never with DB of DB_URL
+# (tests needing DB are skipped without TEST_DB_URL).
+if os.getenv('TEST_DB_URL'):
+    os.environ['DB_URL'] = os.environ['TEST_DB_URL']
@@ -0,0 +1,156 @@
+"""
+Regression test of count of DB queries of hot endpoints.
+
+Count of queries mustn't depend on size of page and count of chapters
+(e.g. lazy loading of relations would add query per item).
+Synthetic books are added to DB of TEST_DB_URL and removed after test
+(test is skipped if DB is unavailable). Requests skip cache, so
+nothing is written to Redis of REDIS_URL.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine, delete, event, exc, select
+
+TEST_DB_URL = os.getenv('TEST_DB_URL')
+
+
+def db_available() -> bool:
+    """
+    Checks if DB of tests is set and accepts connections.
+    """
+    if not TEST_DB_URL:
+
+        return False
+
+    engine = create_engine(TEST_DB_URL)
+    try:
+        with engine.connect():
+
+            return True
+
+    except exc.SQLAlchemyError:
+
+        return False
+
+    finally:
+        engine.dispose()
+
+
+if not db_available():
+    pytest.skip('TEST_DB_URL is not set or DB is unavailable',
+                allow_module_level=True)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.book_handler.bulk_add import write_batch  # noqa: E402
+from app.core.warmup import count_book_request  # noqa: E402
+from app.db import models  # noqa: E402
+from app.db.database import SessionLocal, async_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks.synthetic import make_book_content  # noqa: E402
+
+TITLE_PREFIX = 'Тест запросов'
+PAGE_SIZES = (2, 10)
+AUTHORS = max(PAGE_SIZES)
+BOOKS_OF_AUTHOR = 2
+CHAPTER_COUNTS = (2, 12)
+# Queries of every endpoint: lists count items and select page,
+# author and book are selected with their books or chapters.
+LIST_QUERIES = {'/authors/': 2, '/books/': 2}
+ITEM_QUERIES = {'/authors/{author_id}': 2, '/books/{book_id}': 2}
+
+
+def remove_catalog():
+    """
+    Removing synthetic books of test with their chapters and authors.
+    """
+    books = (select(models.Book.id)
+             .where(models.Book.name.startswith(TITLE_PREFIX)))
+    with SessionLocal() as session, session.begin():
+        session.execute(delete(models.Chapter)
+                        .where(models.Chapter.book_id.in_(books)))
+        session.execute(delete(models.Book)
+                        .where(models.Book.name.startswith(TITLE_PREFIX)))
+        session.execute(delete(models.Author)
+                        .where(models.Author.name.startswith(TITLE_PREFIX)))
+
+
+@pytest.fixture(scope='module')
+def catalog() -> dict[int, dict]:
+    """
+    Ids of author and book for every count of chapters.
+    Books left by interrupted run are replaced, all of them
+    are removed after test.
+    """
+    remove_catalog()
+    books = [make_book_content(f'{TITLE_PREFIX} {chapters} {num}',
+                               f'{TITLE_PREFIX} Автор {num % AUTHORS}',
+                               chapters=chapters,
+                               paragraphs=2)
+             for chapters in CHAPTER_COUNTS
+             for num in range(AUTHORS * BOOKS_OF_AUTHOR)]
+    write_batch(books)
+    try:
+        with SessionLocal() as session:
+            rows = session.execute(
+                select(models.Book.author_id, models.Book.id,
+                       models.Book.name)
+                .where(models.Book.name.startswith(TITLE_PREFIX))
+            ).all()
+
+        yield {chapters: next({'author_id': author_id, 'book_id': book_id}
+                              for author_id, book_id, name in rows
+                              if name.startswith(
+                                  f'{TITLE_PREFIX} {chapters} '
+                              ))
+               for chapters in CHAPTER_COUNTS}
+    finally:
+        remove_catalog()
+
+
+@pytest.fixture(scope='module')
+def client():
+    # Requests of test aren't counted in popular books of app.
+    app.dependency_overrides[count_book_request] = lambda: None
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(count_book_request)
+
+
+@pytest.fixture
+def queries() -> list[str]:
+    """
+    Statements run by async engine of API while test runs.
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', count)
+    yield statements
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', count)
+
+
+def get(client: TestClient, path: str):
+    response = client.get(path, headers={'Cache-Control': 'no-cache'})
+    assert response.status_code == 200
+
+    return response
+
+
+@pytest.mark.parametrize('size', PAGE_SIZES)
+@pytest.mark.parametrize('path', LIST_QUERIES)
+def test_list_queries(catalog, client, queries, path, size):
+    assert len(get(client, f'{path}?size={size}').json()['items']) == size
+    assert len(queries) == LIST_QUERIES[path]
+
+
+@pytest.mark.parametrize('chapters', CHAPTER_COUNTS)
+@pytest.mark.parametrize('path', ITEM_QUERIES)
+def test_item_queries(catalog, client, queries, path, chapters):
+    get(client, path.format(**catalog[chapters]))
+    assert len(queries) == ITEM_QUERIES[path]